@@ -1,8 +1,40 @@
-"""Top-level package for aiolifxc."""
+"""Top-level package for aiolifxc.
 
-from .aiolifx import Lights, Light, LifxDiscovery, LightOffline  # NOQA
-from .colors import Color  # NOQA
+The public classes are imported on first use, so ``import aiolifxc`` and the
+wire codec modules load without asyncio or any third party package.
+"""
+import sys
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
 
 __author__ = """Brian May"""
 __email__ = 'brian@linuxpenguins.xyz'
 __version__ = '1.0.0'
+
+# Exported name -> module it lives in
+_EXPORTS = {
+    "Lights": ".aiolifx",
+    "Light": ".aiolifx",
+    "LifxDiscovery": ".aiolifx",
+    "LightOffline": ".aiolifx",
+    "Color": ".colors",
+}
+
+__all__ = sorted(_EXPORTS)
+
+if TYPE_CHECKING or sys.version_info < (3, 7):
+    # Module level __getattr__ needs Python 3.7
+    from .aiolifx import LifxDiscovery, Light, LightOffline, Lights  # NOQA
+    from .colors import Color  # NOQA
+else:
+    def __getattr__(name: str) -> Any:
+        try:
+            module = _EXPORTS[name]
+        except KeyError:
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+        value = getattr(import_module(module, __name__), name)
+        globals()[name] = value
+        return value
+
+    def __dir__() -> Any:
+        return sorted(set(globals()) | set(_EXPORTS))
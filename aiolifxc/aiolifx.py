@@ -28,36 +28,61 @@ import random
 import socket
 from collections import Awaitable
 from typing import Set  # NOQA
-from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
-                    Text, Tuple, Type, TypeVar, Union, cast)
+from typing import (TYPE_CHECKING, Any, Callable, Dict, Hashable, Iterable,
+                    Iterator, List, Optional, Text, Tuple, Type, TypeVar,
+                    Union, cast)
 
-from . import msgtypes
+from . import cache, msgtypes
+from .breaker import CircuitBreaker
+from .cache import StateCache
 from .colors import Color
-from .message import BROADCAST_MAC, Message
+from .commands import CommandQueue
+from .message import (BROADCAST_MAC, BROADCAST_TARGET, HEADER_SIZE_BYTES,
+                      RESPONSE_FLAGS_OFFSET, HeaderTemplate, Message,
+                      convert_bytes_to_MAC, convert_MAC_to_bytes, pack_bulk)
+from .multiplexer import get_multiplexer
+from .pacer import TokenBucket
+from .pending import InFlightWindow, PendingTable, SingleFlight
 from .products import product_map
-from .unpack import unpack_lifx_message
+from .rtt import RttEstimator
+from .view import MessageView, prefilter
 
 # A couple of constants
 UDP_BROADCAST_IP = "255.255.255.255"
 UDP_BROADCAST_PORT = 56700
-DEFAULT_TIMEOUT = 0.5  # How long to wait for an ack or response
+DEFAULT_TIMEOUT = 0.5  # How long to wait for an ack or response, until the RTT is measured
 DEFAULT_UNREGISTER_TIMEOUT = 0.5  # How long to wait before unregistering a light
 DEFAULT_ATTEMPTS = 3  # How many time should we try to send to the bulb`
 DISCOVERY_INTERVAL = 180
 DISCOVERY_STEP = 5
+# State messages lights send by themselves, when changed by any controller
+STATE_MESSAGE_TYPES = frozenset([
+    msgtypes.LightState,
+    msgtypes.StatePower,
+    msgtypes.LightStatePower,
+    msgtypes.StateLabel,
+])
+# The only messages the discovery listener acts on
+DISCOVERY_MESSAGE_TYPES = frozenset(
+    [msgtypes.MSG_IDS[msgtypes.StateService]] +
+    [msgtypes.MSG_IDS[msg_type] for msg_type in STATE_MESSAGE_TYPES])
+# Counted when a packet passes the prefilter but has no target MAC address
+FILTER_BROADCAST = "broadcast"
+
+if TYPE_CHECKING:
+    from .zones import ColorArray  # NOQA
 
 GenericResponse = TypeVar('GenericResponse', bound=Message)
 Power = Union[bool, int]
+Datagram = Union[bytes, memoryview]
 
 logger = logging.getLogger(__name__)
 
 
-def _mac_to_ipv6_link_local(mac: str, prefix: str) -> str:
+def _mac_to_ipv6_link_local(mac: bytes, prefix: str) -> str:
     """ Translate a MAC address into an IPv6 address in the prefixed network"""
 
-    # Remove the most common delimiters; dots, dashes, etc.
-    trans = str.maketrans(dict([(x, None) for x in [" ", ".", ":", "-"]]))
-    mac_value = int(mac.translate(trans), 16)
+    mac_value = int.from_bytes(mac, "big")
     # Split out the bytes that slot into the IPv6 address
     # XOR the most significant byte with 0x02, inverting the
     # Universal / Local bit
@@ -69,6 +94,25 @@ def _mac_to_ipv6_link_local(mac: str, prefix: str) -> str:
         high2, high1, low1, low2)
 
 
+def _power_to_level(value: Power) -> Power:
+    """ Translate on/off values into the power level sent to lights. """
+    on = [True, 1, "on"]
+    off = [False, 0, "off"]
+
+    if value in on:
+        return 65535
+    elif value in off:
+        return 0
+    return value
+
+
+# Power levels reported by lights
+_POWER_STATES = {
+    0: False,
+    65535: True,
+}  # type: Dict[int, Power]
+
+
 def _nanosec_to_hours(ns: int) -> float:
     return ns / (1000000000.0 * 60 * 60)
 
@@ -150,10 +194,24 @@ class Lights(Iterable['Light']):
 
         The labels must be loaded already in the lights.
         """
+        mac = convert_MAC_to_bytes(mac_addr)
+        result = self.get_clone(light_list=[
+            light
+            for light in iter(self)
+            if light.mac == mac
+        ])
+        return result
+
+    def get_online(self) -> 'Lights':
+        """
+        Get a clone Lights object without the lights that stopped answering.
+
+        :return: The new object.
+        """
         result = self.get_clone(light_list=[
             light
             for light in iter(self)
-            if light.mac_addr == mac_addr
+            if light.online
         ])
         return result
 
@@ -189,26 +247,79 @@ class Lights(Iterable['Light']):
             await light.get_metadata(loop=self._loop)
         await self.do_for_every_light(single_light)
 
-    async def set_power(self, value: Power, rapid: bool=False) -> None:
-        """ Set power for all lights. """
+    async def _set_every_light(
+            self, msg_type: Type[Message], payload: Dict[str, Any],
+            *,
+            rapid: bool,
+            update: Optional[Callable[['Light'], None]]=None,
+            cached: Optional[str]=None) -> None:
+        """
+        Send the same message to every light, encoding it only once.
+
+        :param msg_type: The type of the Message.
+        :param payload: The payload to send.
+        :param rapid: If True then we don't wait for ACKs.
+        :param update: Called for every light the message was sent to.
+        :param cached: The cached attribute changed by the message.
+        """
+        lights = list(self)
+        seq_nums = []  # type: List[int]
+        try:
+            for light in lights:
+                seq_nums.append(0 if rapid else light._seq_next())
+            packets = pack_bulk(
+                msg_type, payload,
+                [(light.mac, light._source_id, seq_num) for light, seq_num in zip(lights, seq_nums)],
+                ack_requested=not rapid)
+        except BaseException:
+            if not rapid:
+                for light, seq_num in zip(lights, seq_nums):
+                    light._pending.release(seq_num)
+            raise
+        requests = dict(zip(lights, zip(seq_nums, packets)))  # type: Dict[Light, Tuple[int, Datagram]]
+
         async def single_light(light: Light) -> None:
-            await light.set_power(value=value, rapid=rapid)
+            seq_num, packed_message = requests[light]
+            if rapid:
+                self._loop.create_task(light._fire_sending(packed_message, 1))
+            else:
+                await light._try_sending_packed(packed_message, seq_num, msgtypes.Acknowledgement)
+            if update is not None:
+                update(light)
+            if cached is not None:
+                light._cache.written(cached, acked=not rapid)
         await self.do_for_every_light(single_light)
 
+    async def set_power(self, value: Power, rapid: bool=False) -> None:
+        """ Set power for all lights. """
+        value = _power_to_level(value)
+
+        def update(light: Light) -> None:
+            light._power_level = _POWER_STATES.get(value, value)
+        await self._set_every_light(
+            msgtypes.SetPower, {"power_level": value}, rapid=rapid, update=update,
+            cached=cache.POWER)
+
     def __str__(self) -> str:
         return format(", ".join(str(d) for d in iter(self)))
 
     async def set_light_power(self, value: Power, duration: int=0, rapid: bool=False) -> None:
         """ Set power for all lights. """
-        async def single_light(light: Light) -> None:
-            await light.set_light_power(value=value, duration=duration, rapid=rapid)
-        await self.do_for_every_light(single_light)
+        value = _power_to_level(value)
+
+        def update(light: Light) -> None:
+            light._power_level = _POWER_STATES.get(value, value)
+        await self._set_every_light(
+            msgtypes.LightSetPower, {"power_level": value, "duration": duration},
+            rapid=rapid, update=update, cached=cache.POWER)
 
     async def set_color(self, color: Color, duration: int = 0, rapid: bool = False) -> None:
         """ Set color for all lights. """
-        async def single_light(light: Light) -> None:
-            await light.set_color(color=color, duration=duration, rapid=rapid)
-        await self.do_for_every_light(single_light)
+        def update(light: Light) -> None:
+            light._color = color
+        await self._set_every_light(
+            msgtypes.LightSetColor, {"color": color.get_values(), "duration": duration},
+            rapid=rapid, update=update, cached=cache.COLOR)
 
     async def set_waveform(
             self, *,
@@ -216,47 +327,58 @@ class Lights(Iterable['Light']):
             transient: int, period: int, cycles: int, duty_cycle: int, waveform: int,
             rapid: bool = False) -> None:
         """ Set waveform for all lights. """
-        async def single_light(light: Light) -> None:
-            await light.set_waveform(
-                color=color,
-                transient=transient, period=period, cycles=cycles, duty_cycle=duty_cycle, waveform=waveform,
-                rapid=rapid)
-
-        await self.do_for_every_light(single_light)
+        value = {
+            'color': color.get_values(),
+            'transient': transient,
+            'period': period,
+            'cycles': cycles,
+            'duty_cycle': duty_cycle,
+            'waveform': waveform,
+        }
+        await self._set_every_light(msgtypes.LightSetWaveform, value, rapid=rapid)
+        for light in iter(self):
+            light._cache.invalidate(cache.COLOR)
 
 
 class Light(aio.DatagramProtocol):
     """ Implement common functions for a LIFX Light. """
 
-    # mac_addr is a string, with the ":" and everything.
+    # mac_addr is a string, with the ":" and everything, or 6 bytes.
     # ip_addr is a string with the ip address
     # port is the port we are connected to
     def __init__(
             self, *, loop: aio.AbstractEventLoop,
-            mac_addr: str, ip_addr: str, port: int
+            mac_addr: Union[str, bytes], ip_addr: str, port: int
             ) -> None:
         """
         Construct a new Light object.
 
         :param loop: The Asyncio event loop.
-        :param mac_addr: The MAC Address. with the ":" and everything.
+        :param mac_addr: The MAC Address, as 6 bytes or with the ":" and everything.
         :param ip_addr: A string with the IP address.
         :param port: The UDP port to use.
         :param lights: The lights list this light belongs to.
         """
         self._loop = loop
-        self._mac_addr = mac_addr.lower()
+        self._mac = convert_MAC_to_bytes(mac_addr)
         self._ip_addr = ip_addr
         self._port = port
         self._retry_count = DEFAULT_ATTEMPTS
-        self._timeout = DEFAULT_TIMEOUT
+        self._rtt = RttEstimator(initial_timeout=DEFAULT_TIMEOUT)
+        self._pacer = TokenBucket(loop=loop)
+        self._commands = CommandQueue(loop=loop, send=self._send_command)
         self._unregister_timeout = DEFAULT_UNREGISTER_TIMEOUT
         self._transport = None  # type: Optional[aio.DatagramTransport]
         self._task = None  # type: Optional[aio.Task]
-        self._seq = 0
-        # Key is the message sequence, value is (response type, Event, response)
-        self._message = {}  # type: Dict[int, List]
+        self._pending = PendingTable(loop=loop)
+        self._window = InFlightWindow(loop=loop)
+        self._gets = SingleFlight(loop=loop)
+        self._cache = StateCache(loop=loop)
+        self._observed = 0
+        self._breaker = CircuitBreaker(loop=loop, probe=self._probe, give_up=self.cleanup)
         self._source_id = random.randint(0, (2 ** 32) - 1)
+        # Key is the message type, value is the header template for this light
+        self._headers = {}  # type: Dict[Type[Message], HeaderTemplate]
         # And the rest
         self._label = None  # type: Optional[str]
         self._location = None  # type: Optional[str]
@@ -286,7 +408,12 @@ class Light(aio.DatagramProtocol):
     @property
     def mac_addr(self) -> str:
         """ Return the MAC address associated with this light. """
-        return self._mac_addr
+        return convert_bytes_to_MAC(self._mac)
+
+    @property
+    def mac(self) -> bytes:
+        """ Return the MAC address associated with this light, as 6 bytes. """
+        return self._mac
 
     @property
     def label(self) -> Optional[str]:
@@ -303,9 +430,99 @@ class Light(aio.DatagramProtocol):
         """ Return the MAC address associated with this light. """
         return self._ip_addr
 
+    @property
+    def rtt(self) -> RttEstimator:
+        """
+        Return the round trip time estimator that sets the retry timeouts.
+
+        Change its ``min_timeout`` and ``max_timeout`` to adjust the limits.
+        """
+        return self._rtt
+
+    @property
+    def pacer(self) -> TokenBucket:
+        """
+        Return the token bucket pacing the packets sent to this light.
+
+        Change its ``rate`` and ``burst`` to adjust the limits.
+        """
+        return self._pacer
+
+    @property
+    def commands(self) -> CommandQueue:
+        """
+        Return the queue that coalesces Set commands waiting to be sent.
+
+        Set its ``enabled`` to True to only send the latest of several
+        ``set_power``, ``set_light_power``, ``set_color``, ``set_color_zones``
+        or ``set_infrared`` calls that are waiting for their turn.
+        """
+        return self._commands
+
+    @property
+    def window(self) -> InFlightWindow:
+        """
+        Return the window limiting the requests in flight to this light.
+
+        Change its ``size`` to allow more or fewer requests at once.
+        """
+        return self._window
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        """
+        Return the circuit breaker that fails requests at once while the light is away.
+
+        Its ``state`` is ``closed`` while the light answers, ``open`` after it
+        stopped answering and ``half-open`` while a probe checks on it. A light
+        that stays away for ``give_up_after`` seconds is cleaned up, so
+        discovery drops it until it is seen again.
+        """
+        return self._breaker
+
+    @property
+    def online(self) -> bool:
+        """ Return False while requests to this light fail without being sent. """
+        return self._breaker.closed
+
+    @property
+    def cache(self) -> StateCache:
+        """
+        Return the record of when the power, colour and infrared state were last known.
+
+        Change its ``ttls`` to set how long each is served without asking the light.
+        """
+        return self._cache
+
+    @property
+    def observed_states(self) -> int:
+        """ Return how many State messages the light sent without being asked. """
+        return self._observed
+
+    @property
+    def shared_replies(self) -> int:
+        """ Return how many Get requests were answered by an identical request already in flight. """
+        return self._gets.joined
+
+    @property
+    def stale_replies(self) -> int:
+        """ Return how many replies arrived that no request was waiting for. """
+        return self._pending.stale
+
     def _seq_next(self) -> int:
-        self._seq = (self._seq + 1) % 128
-        return self._seq
+        """ Reserve a sequence number for a request that expects a reply. """
+        return self._pending.reserve()
+
+    def _pack(self, msg: Message) -> bytes:
+        """ Encode a message for this light, reusing the prebuilt header. """
+        msg_type = type(msg)
+        try:
+            template = self._headers[msg_type]
+        except KeyError:
+            template = HeaderTemplate(
+                msg_type, target_addr=self._mac, source_id=self._source_id)
+            self._headers[msg_type] = template
+        return template.pack_message(msg)
 
     #
     #                            Protocol Methods
@@ -318,13 +535,11 @@ class Light(aio.DatagramProtocol):
     def datagram_received(self, data: Union[bytes, Text], addr: Tuple[str, int]) -> None:
         """ Called when we receive a packet. """
         assert isinstance(data, bytes)
-        response = unpack_lifx_message(data)
-        if response.seq_num in self._message:
-            response_type, myevent, __ = self._message[response.seq_num]
-            if type(response) == response_type:
-                if response.source_id == self._source_id:
-                    self._message[response.seq_num][2] = response
-                    myevent.set()
+        if len(data) < HEADER_SIZE_BYTES:
+            return
+        view = MessageView(data)
+        if view.source_id == self._source_id:
+            self._pending.resolve(view)
 
     def is_alive(self) -> bool:
         if self._transport is None:
@@ -347,12 +562,22 @@ class Light(aio.DatagramProtocol):
             self._port = port
 
         if self._task is None:
-            coro = self._loop.create_datagram_endpoint(
-                lambda: self, family=family, remote_addr=(self._ip_addr, self._port))
-            self._task = self._loop.create_task(coro)
+            self._task = self._loop.create_task(self._connect(family))
 
+        # The light just told discovery about itself
+        self._breaker.reset()
         self._register()
 
+    async def _connect(self, family: int) -> None:
+        """
+        Attach this light to the socket shared by all lights.
+
+        :param family: The address family of the IP address.
+        """
+        multiplexer = get_multiplexer(self._loop, family)
+        transport = await multiplexer.connect(self, (self._ip_addr, self._port))
+        self.connection_made(transport)  # type: ignore
+
     def cleanup(self) -> None:
         """ Cleanup all resources used by this `Light` object. """
         if self._transport:
@@ -361,30 +586,44 @@ class Light(aio.DatagramProtocol):
         if self._task:
             self._task.cancel()
             self._task = None
+        self._breaker.close()
 
     #
     #                            Workflow Methods
     #
 
-    async def _fire_sending(self, msg: Message, num_repeats: int) -> None:
+    async def _send(self, packed_message: Datagram) -> None:
         """
-        Send a message a number of times.
+        Send a packed message once, when the pacer has a token for it.
 
-        :param msg: The message to send.
-        :param num_repeats: The number of times we should send it.
+        :param packed_message: The packed message to send.
+
+        Every packet sent to the light goes through here, so the light never gets
+        more than ``pacer.rate`` messages per second.
         """
-        assert self._transport is not None
+        delay = self._pacer.reserve()
+        if delay > 0:
+            await aio.sleep(delay, loop=self._loop)
+        if self._transport is None:
+            raise LightOffline()
+        self._transport.sendto(packed_message)
 
-        if num_repeats is None:
-            num_repeats = self._retry_count
-        sent_msg_count = 0
-        sleep_interval = 0.05
-        while sent_msg_count < num_repeats:
-            packed_message = msg.generate_packed_message()
-            self._transport.sendto(packed_message)
-            sent_msg_count += 1
-            # Max num of messages light can handle is 20 per second.
-            await aio.sleep(sleep_interval)
+    async def _fire_sending(self, packed_message: Datagram, num_repeats: int) -> None:
+        """
+        Send a packed message a number of times.
+
+        :param packed_message: The packed message to send.
+        :param num_repeats: The number of times we should send it.
+        """
+        if not self._breaker.closed:
+            self._breaker.reject()
+            logger.debug("Not sending to offline light %s", self)
+            return
+        try:
+            for _ in range(num_repeats):
+                await self._send(packed_message)
+        except LightOffline:
+            logger.info("Light is offline %s", self)
 
     def _fire_and_forget(
             self, msg_type: Type[Message], payload: Optional[Dict[str, Any]]=None,
@@ -401,58 +640,226 @@ class Light(aio.DatagramProtocol):
         if payload is None:
             payload = {}
         msg = msg_type(
-            target_addr=self._mac_addr, source_id=self._source_id,
+            target_addr=self._mac, source_id=self._source_id,
             seq_num=0, payload=payload,
             ack_requested=False, response_requested=False)
-        self._loop.create_task(self._fire_sending(msg, num_repeats))
+        self._loop.create_task(self._fire_sending(self._pack(msg), num_repeats))
+
+    def _request(
+            self, msg_type: Type[Message], payload: Dict[str, Any],
+            *,
+            ack_requested: bool,
+            response_requested: bool) -> Tuple[int, bytes]:
+        """
+        Pack a request with a sequence number reserved for its reply.
+
+        :param msg_type: The type of the Message.
+        :param payload: The payload to send.
+        :param ack_requested: Should the light acknowledge the message?
+        :param response_requested: Should the light respond to the message?
+        :return: The sequence number and the packed message.
+
+        The sequence number is released again if the message can't be packed,
+        for example because a value in the payload is out of range.
+        """
+        seq_num = self._seq_next()
+        try:
+            msg = msg_type(
+                target_addr=self._mac, source_id=self._source_id,
+                seq_num=seq_num, payload=payload,
+                ack_requested=ack_requested, response_requested=response_requested)
+            return seq_num, self._pack(msg)
+        except BaseException:
+            self._pending.release(seq_num)
+            raise
 
     async def _try_sending(
-            self, msg: Message, response_type: Type[GenericResponse],
+            self, msg_type: Type[Message], payload: Dict[str, Any],
+            response_type: Type[GenericResponse],
             *,
+            ack_requested: bool,
+            response_requested: bool,
             timeout_secs: Optional[float]=None,
-            max_attempts: Optional[int]=None) -> GenericResponse:
+            max_attempts: Optional[int]=None,
+            probe: bool=False) -> GenericResponse:
         """
         Send message and wait for appropriate response.
 
-        :param msg: The message to be sent.
+        :param msg_type: The type of the Message.
+        :param payload: The payload to send.
+        :param response_type: The type of the Response.
+        :param ack_requested: Should the light acknowledge the message?
+        :param response_requested: Should the light respond to the message?
         :param timeout_secs: The timeout in seconds for each atempt.
         :param max_attempts: The maximum number of attempts.
+        :param probe: If True then send even if the circuit breaker is open.
         :return: The response we got.
         """
-        assert self._transport is not None
+        seq_num, packed_message = self._request(
+            msg_type, payload, ack_requested=ack_requested, response_requested=response_requested)
+        view = await self._try_sending_packed(
+            packed_message, seq_num, response_type,
+            timeout_secs=timeout_secs, max_attempts=max_attempts, probe=probe)
+        return cast(GenericResponse, view.decode())
 
-        self._message[msg.seq_num] = [response_type, None, None]
+    async def _try_sending_packed(
+            self, packed_message: Datagram, seq_num: int, response_type: Type[Message],
+            *,
+            timeout_secs: Optional[float]=None,
+            max_attempts: Optional[int]=None,
+            probe: bool=False) -> MessageView:
+        """
+        Send an already packed message and wait for appropriate response.
 
-        if timeout_secs is None:
-            timeout_secs = self._timeout
+        :param packed_message: The packed message to be sent.
+        :param seq_num: The sequence number of the message, from ``_seq_next()``.
+        :param timeout_secs: The timeout in seconds for each atempt. By default
+            it comes from the measured round trip time, doubling for each retry.
+        :param max_attempts: The maximum number of attempts.
+        :param probe: If True then send even if the circuit breaker is open.
+        :return: The response we got, not yet decoded.
+        """
+        if not probe and not self._breaker.closed:
+            self._pending.release(seq_num)
+            self._breaker.reject()
+            raise LightOffline()
         if max_attempts is None:
             max_attempts = self._retry_count
 
-        attempts = 0
-        while attempts < max_attempts:
-            if msg.seq_num not in self._message:
-                raise RuntimeError("Oops. We couldn't find the message information.")
-            event = aio.Event()
-            self._message[msg.seq_num][1] = event
-            attempts += 1
-            packed_message = msg.generate_packed_message()
-            self._transport.sendto(packed_message)
+        # Requests asking for an ACK change the light, so later requests wait for them
+        barrier = bool(packed_message[RESPONSE_FLAGS_OFFSET] & 2)
+        future = self._pending.expect(seq_num, response_type, ack_requested=barrier)
+        try:
+            await self._window.acquire(barrier=barrier)
             try:
-                await aio.wait_for(event.wait(), timeout_secs)
-                break
-            except aio.TimeoutError:
-                if attempts >= max_attempts:
-                    logger.error(
-                        "Light %s cannot be reached after %s retries",
-                        self, max_attempts)
-                    if msg.seq_num in self._message:
-                        del(self._message[msg.seq_num])
-                    # It's dead Jim
-                    self.cleanup()
-                    raise LightOffline()
-        result = self._message[msg.seq_num][2]
-        del (self._message[msg.seq_num])
-        return cast(GenericResponse, result)
+                for attempt in range(max_attempts):
+                    if timeout_secs is None:
+                        timeout = self._rtt.timeout(attempt)
+                    else:
+                        timeout = timeout_secs
+                    await self._send(packed_message)
+                    sent_at = self._loop.time()
+                    done, __ = await aio.wait([future], timeout=timeout, loop=self._loop)
+                    if done:
+                        if attempt == 0:
+                            # A reply after a retry could be for either send
+                            self._rtt.update(self._loop.time() - sent_at)
+                        self._breaker.record_success()
+                        return cast(MessageView, future.result())
+            finally:
+                self._window.release(barrier=barrier)
+        finally:
+            self._pending.release(seq_num)
+
+        if not probe:
+            logger.error(
+                "Light %s cannot be reached after %s retries",
+                self, max_attempts)
+        # It's dead Jim
+        self._breaker.record_failure()
+        raise LightOffline()
+
+    async def _probe(self) -> None:
+        """ Check if the light answers again, with a single cheap request. """
+        resp = await self._try_sending(
+            msgtypes.GetPower, {}, msgtypes.StatePower,
+            ack_requested=False, response_requested=True, max_attempts=1, probe=True)
+        self._update_from_state(resp)
+
+    async def _set_state(
+            self, msg_type: Type[Message], payload: Dict[str, Any],
+            *,
+            rapid: bool,
+            update: Optional[Callable[[], None]]=None,
+            key: Optional[Hashable]=None,
+            response_type: Optional[Type[Message]]=None,
+            cached: Optional[str]=None) -> Optional[Message]:
+        """
+        Send a Set message, through the command queue if it is enabled.
+
+        :param msg_type: The type of the Message.
+        :param payload: The payload to send.
+        :param rapid: If True then we don't wait for an ACK.
+        :param update: Called to update the cached state once the message was sent.
+        :param key: Queued messages with the same key replace each other.
+            Defaults to the message type.
+        :param response_type: If given, ask for the state in the same round trip
+            as the ACK. It is returned as is: during a transition it is the state
+            when the light got the message, so the cache is updated by `update`.
+        :param cached: The cached attribute changed by the message. It is known
+            once the message is acknowledged.
+        :return: The new state, if `response_type` was given.
+        """
+        if response_type is not None:
+            if rapid:
+                raise ValueError("A rapid message can't wait for the new state")
+            resp = await self._req_with_ack_resp(msg_type, response_type, payload)
+            if update is not None:
+                update()
+            if cached is not None:
+                self._cache.written(cached, acked=True)
+            return resp
+        if self._commands.enabled:
+            await self._commands.submit(
+                msg_type if key is None else key, (msg_type, payload, rapid, update, cached))
+            return None
+        if rapid:
+            self._fire_and_forget(msg_type, payload, num_repeats=1)
+        else:
+            await self._req_with_ack(msg_type, payload)
+        if update is not None:
+            update()
+        if cached is not None:
+            self._cache.written(cached, acked=not rapid)
+        return None
+
+    def _update_from_state(self, msg: Message, at: Optional[float]=None) -> None:
+        """
+        Update the cached state from a State message sent by the light.
+
+        :param msg: The State message.
+        :param at: The loop time the message arrived. Defaults to now.
+        """
+        if isinstance(msg, (msgtypes.LightState, msgtypes.StatePower, msgtypes.LightStatePower)):
+            self._power_level = _POWER_STATES.get(msg.power_level, msg.power_level)
+            self._cache.touch(cache.POWER, at)
+        if isinstance(msg, (msgtypes.LightState, msgtypes.StateLabel)):
+            self._label = msg.label.decode("utf-8", "replace").replace("\x00", "")
+            self._cache.touch(cache.LABEL, at)
+        if isinstance(msg, msgtypes.LightState):
+            self._color = Color.create_from_values(msg.color)
+            self._cache.touch(cache.COLOR, at)
+        elif isinstance(msg, msgtypes.LightStateInfrared):
+            self._infrared_brightness = int(msg.infrared_brightness * 100 / 65535)
+            self._cache.touch(cache.INFRARED, at)
+
+    def _observe(self, view: MessageView) -> None:
+        """
+        Update the cached state from a State message nobody asked for.
+
+        :param view: The message, as received by the discovery listener.
+        """
+        self._observed += 1
+        self._update_from_state(view.decode(), self._loop.time())
+
+    async def _send_command(self, key: Hashable, command: Any) -> None:
+        """ Send a message from the command queue. """
+        msg_type, payload, rapid, update, cached = command
+        if rapid:
+            if not self._breaker.closed:
+                self._breaker.reject()
+                raise LightOffline()
+            msg = msg_type(
+                target_addr=self._mac, source_id=self._source_id,
+                seq_num=0, payload=payload,
+                ack_requested=False, response_requested=False)
+            await self._send(self._pack(msg))
+        else:
+            await self._req_with_ack(msg_type, payload)
+        if update is not None:
+            update()
+        if cached is not None:
+            self._cache.written(cached, acked=not rapid)
 
     async def _req_with_ack(
             self, msg_type: Type[Message], payload: Dict[str, Any],
@@ -470,12 +877,9 @@ class Light(aio.DatagramProtocol):
 
         Usually used for Set messages.
         """
-        msg = msg_type(
-            target_addr=self._mac_addr, source_id=self._source_id,
-            seq_num=self._seq_next(),
-            payload=payload, ack_requested=True, response_requested=False)
         return await self._try_sending(
-            msg, msgtypes.Acknowledgement,
+            msg_type, payload, msgtypes.Acknowledgement,
+            ack_requested=True, response_requested=False,
             timeout_secs=timeout_secs, max_attempts=max_attempts)
 
     # Usually used for Get messages, or for state confirmation after Set (hence the optional payload)
@@ -493,22 +897,24 @@ class Light(aio.DatagramProtocol):
         :param payload: The payload to send.
         :param timeout_secs: The timeout in seconds for each atempt.
         :param max_attempts: The maximum number of attempts.
-        :return:  The ACK response.
+        :return:  The response.
 
-        Usually used for Get messages.
+        Usually used for Get messages. Identical requests made while one is
+        already in flight share its packet and its response.
         """
-        if payload is None:
-            payload = {}
-        msg = msg_type(
-            target_addr=self._mac_addr, source_id=self._source_id,
-            seq_num=self._seq_next(),
-            payload=payload, ack_requested=False, response_requested=True)
-        return await self._try_sending(
-            msg, response_type, timeout_secs=timeout_secs, max_attempts=max_attempts)
+        values = {} if payload is None else payload  # type: Dict[str, Any]
+
+        async def request() -> GenericResponse:
+            return await self._try_sending(
+                msg_type, values, response_type,
+                ack_requested=False, response_requested=True,
+                timeout_secs=timeout_secs, max_attempts=max_attempts)
+        key = (msg_type, response_type, tuple(sorted(values.items())), timeout_secs, max_attempts)
+        return cast(GenericResponse, await self._gets.run(key, request))
 
     async def _req_with_ack_resp(
             self, msg_type: Type[Message], response_type: Type[GenericResponse],
-            payload: Dict[str, str],
+            payload: Dict[str, Any],
             *,
             timeout_secs: Optional[int]=None,
             max_attempts: Optional[int]=None) -> GenericResponse:
@@ -520,17 +926,15 @@ class Light(aio.DatagramProtocol):
         :param payload: The payload to send.
         :param timeout_secs: The timeout in seconds for each atempt.
         :param max_attempts: The maximum number of attempts.
-        :return:  The ACK response.
+        :return:  The response.
 
-        FIXME: Not currently implemented, although the LIFX LAN protocol supports
-        this kind of workflow natively.
+        Used to confirm a Set message. The light sends the ACK and then the
+        response, both in reply to the same packet.
         """
-        msg = msg_type(
-            target_addr=self._mac_addr, source_id=self._source_id,
-            seq_num=self._seq_next(),
-            payload=payload, ack_requested=True, response_requested=True)
         return await self._try_sending(
-            msg, response_type, timeout_secs=timeout_secs, max_attempts=max_attempts)
+            msg_type, payload, response_type,
+            ack_requested=True, response_requested=True,
+            timeout_secs=timeout_secs, max_attempts=max_attempts)
 
     #
     #                            Attribute Methods
@@ -543,9 +947,8 @@ class Light(aio.DatagramProtocol):
         """
         label = self._label  # type: Optional[str]
         if label is None:
-            resp = await self._req_with_resp(
-                msgtypes.GetLabel, msgtypes.StateLabel)  # type: msgtypes.StateLabel
-            self._label = resp.label.decode().replace("\x00", "")
+            resp = await self._req_with_resp(msgtypes.GetLabel, msgtypes.StateLabel)
+            self._update_from_state(resp)
         assert self._label is not None
         return self._label
 
@@ -600,42 +1003,39 @@ class Light(aio.DatagramProtocol):
     #     self.resp_set_group(resp)
     #     return self.group
 
-    async def get_power(self) -> Power:
+    async def get_power(self, max_age: Optional[float]=None) -> Power:
         """
         Get the power setting.
 
+        :param max_age: The oldest cached value to accept, in seconds. Defaults to
+            ``cache.ttls[POWER]``. Use 0 to always ask the light.
         :return: The current power setting. Should normally be True or False.
         """
-        table = {
-            0: False,
-            65535: True,
-        }
-        resp = await self._req_with_resp(
-            msgtypes.GetPower, msgtypes.StatePower)  # type: msgtypes.StatePower
-        self._power_level = table.get(resp.power_level, resp.power_level)
+        if not self._cache.fresh(cache.POWER, max_age):
+            resp = await self._req_with_resp(msgtypes.GetPower, msgtypes.StatePower)
+            self._update_from_state(resp)
         assert self._power_level is not None
         return self._power_level
 
-    async def set_power(self, value: Power, rapid: bool=False) -> None:
+    async def set_power(
+            self, value: Power, rapid: bool=False,
+            confirm: bool=False) -> Optional[msgtypes.StatePower]:
         """
         Set the current Power level.
 
         :param value: Normally True or False.
         :param rapid: If True then we don't wait for an ACK.
+        :param confirm: If True then get the new state with the ACK.
+        :return: The state reported by the light, if `confirm` is True. It is
+            not cached, since it may be from before a transition finished.
         """
-        on = [True, 1, "on"]
-        off = [False, 0, "off"]
+        value = _power_to_level(value)
 
-        if value in on:
-            value = 65535
-        elif value in off:
-            value = 0
-
-        if not rapid:
-            await self._req_with_ack(msgtypes.SetPower, {"power_level": value})
-        else:
-            self._fire_and_forget(msgtypes.SetPower, {"power_level": value})
-        self._power_level = value
+        def update() -> None:
+            self._power_level = _POWER_STATES.get(value, value)
+        return cast(Optional[msgtypes.StatePower], await self._set_state(
+            msgtypes.SetPower, {"power_level": value}, rapid=rapid, update=update,
+            cached=cache.POWER, response_type=msgtypes.StatePower if confirm else None))
 
     async def get_wifi_firmware(self) -> Tuple[str, int]:
         """
@@ -718,7 +1118,8 @@ class Light(aio.DatagramProtocol):
         :param loop: The asyncio event loop.
 
         This is a shortcut for running the following functions concurrently and
-        waiting for all of them to return:
+        waiting for all of them to return. The requests are sent in this order and
+        pipelined, up to ``window.size`` at a time:
 
         * ``self.get_label()``
         * ``self.get_location()``
@@ -748,7 +1149,7 @@ class Light(aio.DatagramProtocol):
         :return: The resultant string.
         """
         s = "{}\n".format(self._label)
-        s += indent + "MAC Address: {}\n".format(self._mac_addr)
+        s += indent + "MAC Address: {}\n".format(self.mac_addr)
         s += indent + "IP Address: {}\n".format(self._ip_addr)
         s += indent + "Port: {}\n".format(self._port)
         s += indent + "Power: {}\n".format(_str_map(self._power_level))
@@ -854,87 +1255,78 @@ class Light(aio.DatagramProtocol):
         """ Print identification. """
         return "<{} {} ({})>".format(type(self).__name__, self._label, self.mac_addr)
 
-    async def get_light_power(self) -> Power:
+    async def get_light_power(self, max_age: Optional[float]=None) -> Power:
         """
         Get the light's power setting.
 
+        :param max_age: The oldest cached value to accept, in seconds. Defaults to
+            ``cache.ttls[POWER]``. Use 0 to always ask the light.
         :return: The light's power setting.
         """
-        table = {
-            0: False,
-            65535: True,
-        }
-        resp = await self._req_with_resp(
-            msgtypes.LightGetPower,
-            msgtypes.LightStatePower)  # type: msgtypes.LightStatePower
-        self._power_level = table.get(resp.power_level, resp.power_level)
+        if not self._cache.fresh(cache.POWER, max_age):
+            resp = await self._req_with_resp(msgtypes.LightGetPower, msgtypes.LightStatePower)
+            self._update_from_state(resp)
         assert self._power_level is not None
         return self._power_level
 
-    async def set_light_power(self, value: Power, duration: int=0, rapid: bool=False) -> None:
+    async def set_light_power(
+            self, value: Power, duration: int=0, rapid: bool=False,
+            confirm: bool=False) -> Optional[msgtypes.LightStatePower]:
         """
         Ste the light's power setting.
 
         :param value: The new power setting.
         :param duration: The duration in ms to gradually make the change.
         :param rapid: If True then we don't wait for an ACK.
+        :param confirm: If True then get the new state with the ACK.
+        :return: The state reported by the light, if `confirm` is True. It is
+            not cached, since it may be from before a transition finished.
         """
-        on = [True, 1, "on"]
-        off = [False, 0, "off"]
-
-        if value in on:
-            value = 65535
-        elif value in off:
-            value = 0
+        value = _power_to_level(value)
 
-        if not rapid:
-            await self._req_with_ack(
-                msgtypes.LightSetPower, {"power_level": value, "duration": duration})
-        else:
-            self._fire_and_forget(
-                msgtypes.LightSetPower, {"power_level": value, "duration": duration},
-                num_repeats=1)
-        self._power_level = value
+        def update() -> None:
+            self._power_level = _POWER_STATES.get(value, value)
+        return cast(Optional[msgtypes.LightStatePower], await self._set_state(
+            msgtypes.LightSetPower, {"power_level": value, "duration": duration},
+            rapid=rapid, update=update, cached=cache.POWER,
+            response_type=msgtypes.LightStatePower if confirm else None))
 
-    async def get_color(self) -> Color:
+    async def get_color(self, max_age: Optional[float]=None) -> Color:
         """
         Get the color of the light.
 
+        :param max_age: The oldest cached value to accept, in seconds. Defaults to
+            ``cache.ttls[COLOR]``. Use 0 to always ask the light.
         :return: The color of the light.
         """
-        resp = await self._req_with_resp(
-            msgtypes.LightGet, msgtypes.LightState)  # type: msgtypes.LightState
-
-        table = {
-            0: False,
-            65535: True,
-        }
-        self._power_level = table.get(resp.power_level, resp.power_level)
-        self._color = Color.create_from_values(resp.color)
-        self._label = resp.label.decode().replace("\x00", "")
-
+        if not self._cache.fresh(cache.COLOR, max_age):
+            resp = await self._req_with_resp(msgtypes.LightGet, msgtypes.LightState)
+            self._update_from_state(resp)
+        assert self._color is not None
         return self._color
 
-    async def set_color(self, color: Color, duration: int=0, rapid: bool=False) -> None:
+    async def set_color(
+            self, color: Color, duration: int=0, rapid: bool=False,
+            confirm: bool=False) -> Optional[msgtypes.LightState]:
         """
         Set the color of the light.
 
         :param color: Input colour.
         :param duration: Time to make change in ms.
         :param rapid: If True then we don't wait for an ACK.
-        :return: The new color of the light.
+        :param confirm: If True then get the new state with the ACK.
+        :return: The state reported by the light, if `confirm` is True. It is
+            not cached, since it may be from before a transition finished.
+
+        While a change with a `duration` is in progress, the reported colour is
+        the colour at the time the light got the message.
         """
-        value = color.get_values()
-        if rapid:
-            self._fire_and_forget(
-                msgtypes.LightSetColor,
-                {"color": value, "duration": duration},
-                num_repeats=1)
-        else:
-            await self._req_with_ack(
-                msgtypes.LightSetColor,
-                {"color": value, "duration": duration})
-        self._color = color
+        def update() -> None:
+            self._color = color
+        return cast(Optional[msgtypes.LightState], await self._set_state(
+            msgtypes.LightSetColor, {"color": color.get_values(), "duration": duration},
+            rapid=rapid, update=update, cached=cache.COLOR,
+            response_type=msgtypes.LightState if confirm else None))
 
     async def get_color_zones(
             self, start_index: int, end_index: Optional[int]=None) -> List[Color]:
@@ -961,6 +1353,28 @@ class Light(aio.DatagramProtocol):
 
         return self._color_zones
 
+    async def get_color_zones_array(self, start_index: int, end_index: Optional[int]=None) -> 'ColorArray':
+        """
+        Get color zones as an array, without creating `Color` objects.
+
+        :param start_index: The start index.
+        :param end_index: The end Index.
+        :return: A (8, 4) uint16 array of HSBK values, as sent by the light.
+
+        Requires NumPy.
+        """
+        # Imported here so NumPy is only loaded when it is used
+        from . import zones
+
+        if end_index is None:
+            end_index = start_index + 8
+        seq_num, packed_message = self._request(
+            msgtypes.MultiZoneGetColorZones, {"start_index": start_index, "end_index": end_index},
+            ack_requested=False, response_requested=True)
+        view = await self._try_sending_packed(
+            packed_message, seq_num, msgtypes.MultiZoneStateMultiZone)
+        return zones.view_colors(view)
+
     async def set_color_zones(
             self, start_index: int, end_index: int, color: Color,
             duration: int=0, apply: int=1, rapid: bool=False) -> None:
@@ -981,13 +1395,10 @@ class Light(aio.DatagramProtocol):
             "duration": duration,
             "apply": apply,
         }
-
-        if rapid:
-            self._fire_and_forget(
-                msgtypes.MultiZoneSetColorZones, args, num_repeats=1)
-        else:
-            await self._req_with_ack(
-                msgtypes.MultiZoneSetColorZones, args)
+        await self._set_state(
+            msgtypes.MultiZoneSetColorZones, args, rapid=rapid,
+            key=(msgtypes.MultiZoneSetColorZones, start_index, end_index))
+        self._cache.invalidate(cache.COLOR)
 
     async def set_waveform(
             self, *,
@@ -1020,33 +1431,41 @@ class Light(aio.DatagramProtocol):
         else:
             await self._req_with_ack(
                 msgtypes.LightSetWaveform, value)
+        self._cache.invalidate(cache.COLOR)
 
-    async def get_infrared(self) -> int:
+    async def get_infrared(self, max_age: Optional[float]=None) -> int:
         """
         Get infra-red brightness.
+
+        :param max_age: The oldest cached value to accept, in seconds. Defaults to
+            ``cache.ttls[INFRARED]``. Use 0 to always ask the light.
         :return: Number 0-100.
         """
-        resp = await self._req_with_resp(
-            msgtypes.LightGetInfrared,
-            msgtypes.LightStateInfrared)  # type: msgtypes.LightStateInfrared
-        self._infrared_brightness = int(resp.infrared_brightness * 100 / 65535)
+        if not self._cache.fresh(cache.INFRARED, max_age):
+            resp = await self._req_with_resp(msgtypes.LightGetInfrared, msgtypes.LightStateInfrared)
+            self._update_from_state(resp)
+        assert self._infrared_brightness is not None
         return self._infrared_brightness
 
-    async def set_infrared(self, infrared_brightness: int, rapid: bool=False) -> None:
+    async def set_infrared(
+            self, infrared_brightness: int, rapid: bool=False,
+            confirm: bool=False) -> Optional[msgtypes.LightStateInfrared]:
         """
         Set infra-red brightness.
 
         :param infrared_brightness:  Number 0-100.
         :param rapid: If True then we don't wait for an ACK.
+        :param confirm: If True then get the new state with the ACK.
+        :return: The state reported by the light, if `confirm` is True. It is
+            not cached, since it may be from before a transition finished.
         """
         value = int(infrared_brightness * 65535 / 100)
-        if rapid:
-            self._fire_and_forget(
-                msgtypes.LightSetInfrared, {"infrared_brightness": value}, num_repeats=1)
-        else:
-            await self._req_with_ack(
-                msgtypes.LightSetInfrared, {"infrared_brightness": value})
-        self._infrared_brightness = value
+
+        def update() -> None:
+            self._infrared_brightness = infrared_brightness
+        return cast(Optional[msgtypes.LightStateInfrared], await self._set_state(
+            msgtypes.LightSetInfrared, {"infrared_brightness": value}, rapid=rapid, update=update,
+            cached=cache.INFRARED, response_type=msgtypes.LightStateInfrared if confirm else None))
 
 
 class LifxDiscovery:
@@ -1115,7 +1534,7 @@ class LifxDiscoveryProtocol(aio.DatagramProtocol):
         :param discovery_interval: How often should we rerun discover (seconds)?
         :param discovery_step: How often should we wake up (seconds)?
         """
-        self._seen = {}  # type: Dict[str, Light]
+        self._seen = {}  # type: Dict[bytes, Light]
         self._transport = None  # type: Optional[aio.DatagramTransport]
         self._loop = loop
         self._source_id = random.randint(0, (2 ** 32) - 1)
@@ -1123,10 +1542,16 @@ class LifxDiscoveryProtocol(aio.DatagramProtocol):
         self._discovery_interval = discovery_interval
         self._discovery_step = discovery_step
         self._discovery_countdown = 0
+        self._filtered = {}  # type: Dict[str, int]
 
     def get_lights(self) -> List[Light]:
         return list(self._seen.values())
 
+    @property
+    def filtered(self) -> Dict[str, int]:
+        """ Return how many packets the header prefilter dropped, by reason. """
+        return dict(self._filtered)
+
     def connection_made(self, transport: aio.BaseTransport) -> None:
         """ Called when we receive a connection. """
         self._transport = cast(aio.DatagramTransport, transport)
@@ -1138,48 +1563,58 @@ class LifxDiscoveryProtocol(aio.DatagramProtocol):
     def datagram_received(self, data: Union[bytes, Text], addr: Tuple[str, int]) -> None:
         """ Called when we receive a packet. """
         assert isinstance(data, bytes)
-        response = unpack_lifx_message(data)
-        ip_addr = addr[0]
-
-        mac_addr = response.target_addr
-        if mac_addr == BROADCAST_MAC:
+        reason = prefilter(data, DISCOVERY_MESSAGE_TYPES)
+        if reason is None and data[8:14] == BROADCAST_TARGET:
+            reason = FILTER_BROADCAST
+        if reason is not None:
+            self._filtered[reason] = self._filtered.get(reason, 0) + 1
             return
+        response = MessageView(data)
+        ip_addr = addr[0]
 
-        if type(response) == msgtypes.StateService:
+        msg_type = response.msg_type
+        if msg_type is msgtypes.StateService:
             # discovered
-            assert isinstance(response, msgtypes.StateService)
             if response.service == 1:  # only look for UDP services
                 remote_port = response.port
             else:
                 return
-        elif type(response) == msgtypes.LightState:
+        elif msg_type is msgtypes.LightState:
             # looks like the lights are volunteering LightState after booting
             remote_port = UDP_BROADCAST_PORT
         else:
+            # Power or label changed, perhaps by another controller
+            seen = self._seen.get(response.target)
+            if seen is not None:
+                seen._observe(response)
             return
 
+        mac = response.target
+
         if self._ipv6prefix:
             family = socket.AF_INET6
-            remote_ip = _mac_to_ipv6_link_local(mac_addr, self._ipv6prefix)
+            remote_ip = _mac_to_ipv6_link_local(mac, self._ipv6prefix)
         else:
             family = socket.AF_INET
             remote_ip = ip_addr
 
-        if mac_addr in self._seen:
+        if mac in self._seen:
             # rediscovered
-            light = self._seen[mac_addr]  # type: Light
+            light = self._seen[mac]  # type: Light
             logger.debug("Rediscovered light %s", light)
         else:
             # newly discovered
             light = Light(
                 loop=self._loop,
-                mac_addr=mac_addr,
+                mac_addr=mac,
                 ip_addr=remote_ip,
                 port=remote_port,
             )
-            self._seen[mac_addr] = light
+            self._seen[mac] = light
             logger.debug("Discovered light %s", light)
         light.renew(family=family, ip_addr=remote_ip, port=remote_port)
+        if msg_type is msgtypes.LightState:
+            light._observe(response)
 
     def _discover(self) -> None:
         """ Called regularly based on ``discovery_step`` parameter. """
@@ -1188,10 +1623,10 @@ class LifxDiscoveryProtocol(aio.DatagramProtocol):
             assert self._transport is not None
 
             try:
-                new_seen = {}  # type: Dict[str, Light]
-                for mac_addr, light in self._seen.items():
+                new_seen = {}  # type: Dict[bytes, Light]
+                for mac, light in self._seen.items():
                     if light.is_alive():
-                        new_seen[mac_addr] = light
+                        new_seen[mac] = light
                     else:
                         logger.info("Dropping light %s", light)
                 self._seen = new_seen
@@ -0,0 +1,163 @@
+""" Circuit breaker for a light that stopped answering.
+
+A light that is switched off at the wall takes every request the full retry
+budget to fail. A :class:`CircuitBreaker` opens after a light fails to
+answer a few requests in a row, so later requests fail at once instead.
+While it is open a probe is sent now and then, less often the longer the
+light stays away; the breaker is half-open while a probe is in flight and
+closes again once one is answered. A light that stays away for too long is
+given up on, and probing stops.
+"""
+import asyncio as aio
+import logging
+from typing import Awaitable, Callable, Optional  # NOQA
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+DEFAULT_FAILURE_THRESHOLD = 3  # Requests given up in a row before opening
+DEFAULT_PROBE_INTERVAL = 5.0  # Seconds before the first probe
+DEFAULT_MAX_PROBE_INTERVAL = 60.0  # Longest time between probes
+DEFAULT_GIVE_UP_AFTER = 600.0  # Seconds open before giving up on the light
+
+Probe = Callable[[], Awaitable[None]]
+GiveUp = Callable[[], None]
+
+logger = logging.getLogger(__name__)
+
+# asyncio.current_task is new in Python 3.7 and Task.current_task is deprecated
+_current_task = getattr(aio, "current_task", None) or aio.Task.current_task
+
+
+class CircuitBreaker(object):
+    """ Closed, open or half-open state of one light. """
+
+    def __init__(
+            self, *, loop: aio.AbstractEventLoop, probe: Probe,
+            failure_threshold: int=DEFAULT_FAILURE_THRESHOLD,
+            probe_interval: float=DEFAULT_PROBE_INTERVAL,
+            max_probe_interval: float=DEFAULT_MAX_PROBE_INTERVAL,
+            give_up: Optional[GiveUp]=None,
+            give_up_after: float=DEFAULT_GIVE_UP_AFTER) -> None:
+        """
+        Create a closed breaker.
+
+        :param loop: The asyncio event loop.
+        :param probe: Called to check if the light answers again. It must call
+            `record_success` or `record_failure`, or raise.
+        :param failure_threshold: Requests given up in a row before opening.
+        :param probe_interval: Seconds from opening to the first probe.
+        :param max_probe_interval: The most seconds between two probes.
+        :param give_up: Called once a probe fails after the breaker has been
+            open for ``give_up_after`` seconds. No more probes are sent.
+        :param give_up_after: Seconds open before giving up on the light.
+        """
+        if failure_threshold < 1 or not 0 < probe_interval <= max_probe_interval:
+            raise ValueError("Need failure_threshold >= 1 and 0 < probe_interval <= max_probe_interval")
+        if give_up_after <= 0:
+            raise ValueError("Need give_up_after > 0")
+        self._loop = loop
+        self._probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self._give_up = give_up
+        self.give_up_after = give_up_after
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None  # type: Optional[float]
+        self._task = None  # type: Optional[aio.Task]
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        """ Return ``CLOSED``, ``OPEN`` or ``HALF_OPEN``. """
+        return self._state
+
+    @property
+    def closed(self) -> bool:
+        """ Return True if requests may be sent. """
+        return self._state == CLOSED
+
+    @property
+    def opened_at(self) -> Optional[float]:
+        """ Return the loop time the breaker opened, or None if it is closed. """
+        return self._opened_at
+
+    @property
+    def rejected(self) -> int:
+        """ Return how many requests failed at once because the breaker was not closed. """
+        return self._rejected
+
+    def reject(self) -> None:
+        """ Count a request that was not sent. """
+        self._rejected += 1
+
+    def record_success(self) -> None:
+        """ Note that the light answered. Closes the breaker. """
+        self._failures = 0
+        if self._opened_at is not None:
+            logger.info("Light answers again after %.1f seconds", self._loop.time() - self._opened_at)
+        self._state = CLOSED
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        """ Note that the light did not answer. Opens the breaker after enough failures. """
+        self._failures += 1
+        if self._state == HALF_OPEN:
+            self._state = OPEN
+        elif self._state == CLOSED and self._failures >= self.failure_threshold:
+            self._state = OPEN
+            self._opened_at = self._loop.time()
+            if self._task is None:
+                self._task = self._loop.create_task(self._run_probes())
+
+    def reset(self) -> None:
+        """ Close the breaker without probing, when the light was seen by other means. """
+        self._stop()
+        self.record_success()
+
+    def close(self) -> None:
+        """ Stop probing. The state is kept. """
+        self._stop()
+
+    def _stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_probes(self) -> None:
+        """ Probe the light with growing intervals until the breaker is closed. """
+        interval = self.probe_interval
+        try:
+            while self._state != CLOSED:
+                await aio.sleep(interval, loop=self._loop)
+                if self._state == CLOSED:
+                    break
+                self._state = HALF_OPEN
+                try:
+                    await self._probe()
+                except aio.CancelledError:
+                    raise
+                except Exception:
+                    if self._state == HALF_OPEN:
+                        self._state = OPEN
+                if self._state != CLOSED and self._gave_up():
+                    break
+                interval = min(interval * 2, self.max_probe_interval)
+        finally:
+            if self._task is _current_task(loop=self._loop):
+                self._task = None
+
+    def _gave_up(self) -> bool:
+        """ Give up on the light if it has been away too long. """
+        if self._give_up is None or self._opened_at is None:
+            return False
+        if self._loop.time() - self._opened_at < self.give_up_after:
+            return False
+        logger.info("Giving up on light after %.1f seconds", self._loop.time() - self._opened_at)
+        # Keep cleanup in give_up from cancelling this task
+        self._task = None
+        self._give_up()
+        return True
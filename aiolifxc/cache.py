@@ -0,0 +1,115 @@
+""" Freshness of the state cached for a light.
+
+The power level, colour, infrared brightness and label of a light are kept
+on the :class:`~aiolifxc.aiolifx.Light` as they are learnt, from replies or
+from State messages the light sends by itself. A :class:`StateCache`
+records when each of them was last known to match the light, so a getter can
+answer from the cache while the value is younger than its time to live and
+only ask the light once it is stale. A value written by an acknowledged Set
+counts as known; one written by a rapid Set, which may have been lost, does
+not.
+"""
+import asyncio as aio
+from typing import Dict, Optional  # NOQA
+
+POWER = "power"
+COLOR = "color"
+INFRARED = "infrared"
+LABEL = "label"
+
+# Seconds a value is served from the cache, by attribute. The label is only
+# fetched once, so it has none.
+DEFAULT_TTLS = {
+    POWER: 5.0,
+    COLOR: 5.0,
+    INFRARED: 30.0,
+}  # type: Dict[str, float]
+
+
+class StateCache(object):
+    """ When each cached attribute of one light was last known. """
+
+    def __init__(self, *, loop: aio.AbstractEventLoop) -> None:
+        """
+        Create a cache with nothing known yet.
+
+        :param loop: The asyncio event loop, used as the clock.
+        """
+        self._loop = loop
+        self.ttls = dict(DEFAULT_TTLS)
+        self._updated = {}  # type: Dict[str, float]
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        """ Return how many reads were answered from the cache. """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """ Return how many reads had to ask the light. """
+        return self._misses
+
+    def touch(self, name: str, at: Optional[float]=None) -> None:
+        """
+        Note that an attribute is known to match the light.
+
+        :param name: The attribute, like ``POWER``.
+        :param at: The loop time it was known at. Defaults to now.
+        """
+        if at is None:
+            at = self._loop.time()
+        if at >= self._updated.get(name, at):
+            self._updated[name] = at
+
+    def written(self, name: str, acked: bool) -> None:
+        """
+        Note that an attribute was set.
+
+        :param name: The attribute, like ``POWER``.
+        :param acked: If the light acknowledged the Set.
+        """
+        if acked:
+            self.touch(name)
+        else:
+            self.invalidate(name)
+
+    def invalidate(self, name: Optional[str]=None) -> None:
+        """
+        Forget when an attribute was known, so the next read asks the light.
+
+        :param name: The attribute, or None for all of them.
+        """
+        if name is None:
+            self._updated.clear()
+        else:
+            self._updated.pop(name, None)
+
+    def updated_at(self, name: str) -> Optional[float]:
+        """ Return the loop time an attribute was last known, or None. """
+        return self._updated.get(name)
+
+    def age(self, name: str) -> Optional[float]:
+        """ Return how many seconds ago an attribute was last known, or None. """
+        updated = self._updated.get(name)
+        if updated is None:
+            return None
+        return self._loop.time() - updated
+
+    def fresh(self, name: str, max_age: Optional[float]=None) -> bool:
+        """
+        Check if a read of an attribute can be answered from the cache.
+
+        :param name: The attribute, like ``POWER``.
+        :param max_age: The oldest value to accept, in seconds. Defaults to the
+            time to live of the attribute. Use 0 to always ask the light.
+        :return: True if the cached value is young enough.
+        """
+        limit = self.ttls.get(name, 0.0) if max_age is None else max_age
+        age = self.age(name)
+        if age is not None and age < limit:
+            self._hits += 1
+            return True
+        self._misses += 1
+        return False
@@ -0,0 +1,90 @@
+""" Latest-wins queue of commands for a light.
+
+A slider or an automation can ask for many colours per second. Sending all
+of them only makes the light work through states nobody wants any more.
+A :class:`CommandQueue` keeps at most one waiting command of each kind: a
+new command replaces a waiting one of the same kind, and everyone who asked
+for the replaced command is told when the newer command is done.
+"""
+import asyncio as aio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set  # NOQA
+
+Sender = Callable[[Hashable, Any], Awaitable[None]]
+
+
+def _retrieve_exception(future: aio.Future) -> None:
+    """ Mark a failure as seen, in case every caller waiting for it was cancelled. """
+    if not future.cancelled():
+        future.exception()
+
+
+class _Command(object):
+    __slots__ = ("value", "future")
+
+    def __init__(self, value: Any, future: aio.Future) -> None:
+        self.value = value
+        self.future = future
+
+
+class CommandQueue(object):
+    """ Coalesce commands of the same kind that are waiting to be sent. """
+
+    def __init__(self, *, loop: aio.AbstractEventLoop, send: Sender) -> None:
+        """
+        Create an empty queue. It is not used until it is enabled.
+
+        :param loop: The asyncio event loop.
+        :param send: Called with the key and value of each command to send.
+        """
+        self._loop = loop
+        self._send = send
+        self.enabled = False
+        # Key is the kind of command
+        self._waiting = {}  # type: Dict[Hashable, _Command]
+        self._running = set()  # type: Set[Hashable]
+        self._superseded = 0
+
+    @property
+    def superseded(self) -> int:
+        """ Return how many commands were replaced by a newer one before being sent. """
+        return self._superseded
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    async def submit(self, key: Hashable, value: Any) -> None:
+        """
+        Queue a command, replacing a waiting command of the same kind.
+
+        :param key: The kind of command. Only commands with the same key coalesce.
+        :param value: Passed to ``send`` when the command is sent.
+
+        Returns once this command, or the command that replaced it, is done.
+        """
+        command = self._waiting.get(key)
+        if command is None:
+            command = _Command(value, self._loop.create_future())
+            command.future.add_done_callback(_retrieve_exception)
+            self._waiting[key] = command
+            if key not in self._running:
+                self._running.add(key)
+                self._loop.create_task(self._run(key))
+        else:
+            command.value = value
+            self._superseded += 1
+        # Cancelling one caller must not cancel the command for the others
+        await aio.shield(command.future, loop=self._loop)
+
+    async def _run(self, key: Hashable) -> None:
+        """ Send the commands of one kind, one at a time, until none are waiting. """
+        try:
+            while key in self._waiting:
+                command = self._waiting.pop(key)
+                try:
+                    await self._send(key, command.value)
+                except Exception as e:
+                    command.future.set_exception(e)
+                else:
+                    command.future.set_result(None)
+        finally:
+            self._running.discard(key)
@@ -2,107 +2,196 @@
 # Author: Meghan Clark
 
 import struct
-from typing import Any, Dict, List, Optional, Tuple  # NOQA
+from typing import (TYPE_CHECKING, Any, Dict, List, Optional, Sequence,  # NOQA
+                    Set, Tuple, Type, Union, cast)
 
-import bitstring
+from .schema import Schema
 
 BROADCAST_MAC = "00:00:00:00:00:00"
+BROADCAST_TARGET = bytes(6)
 BROADCAST_SOURCE_ID = 0
 
 HEADER_SIZE_BYTES = 36
 
+# Frame: size, origin/tagged/addressable/protocol, source
+# Frame Address: target (6 bytes + 2 padding), 6 reserved, response flags, sequence
+# Protocol Header: 8 reserved, message type, 2 reserved
+HEADER_STRUCT = struct.Struct("<HHI6s2x6xBB8xH2x")
+# Byte offsets of the per-packet header fields
+SIZE_OFFSET = 0
+RESPONSE_FLAGS_OFFSET = 22
+SEQ_NUM_OFFSET = 23
+
+_UINT16 = struct.Struct("<H")
+# Flags, source and target, starting at byte 2
+_ADDRESS_STRUCT = struct.Struct("<HI6s")
+
+# Classes for received message types that aren't in msgtypes
+_UNKNOWN_TYPES = {}  # type: Dict[int, Type[Message]]
+
+
+class MessageMeta(type):
+    """
+    Give each message class ``__slots__`` for its payload fields.
+
+    Messages are created and received at a high rate, so they don't carry a
+    ``__dict__``. Classes that don't define ``__slots__`` get one slot for
+    each field of their schema that isn't already a slot of a base class.
+    """
+
+    def __new__(
+            mcs, name: str, bases: Tuple[type, ...],
+            namespace: Dict[str, Any]) -> 'MessageMeta':
+        if "__slots__" not in namespace:
+            inherited = set()  # type: Set[str]
+            for base in bases:
+                for klass in base.__mro__:
+                    inherited.update(getattr(klass, "__slots__", ()))
+            schema = namespace.get("schema")
+            names = schema.names if schema is not None else ()
+            namespace["__slots__"] = tuple(
+                field_name for field_name in names if field_name not in inherited)
+        # mypy types type.__new__ as returning a plain type, not mcs
+        return cast('MessageMeta', super().__new__(mcs, name, bases, namespace))
+
+
+class Message(object, metaclass=MessageMeta):
+    """
+    A LIFX message.
+
+    Messages can't be changed once constructed. The packed bytes are
+    computed on first use and reused after that, so a message can be sent
+    any number of times for the cost of encoding it once.
+    """
+    __slots__ = (
+        "size", "origin", "tagged", "addressable", "protocol", "source_id",
+        "target", "reserved", "ack_requested", "response_requested", "seq_num",
+        "_packed",
+    )
+
+    # Payload layout; override in messages with a payload
+    schema = Schema()
+    # 16 bits/uint16, set for each type in msgtypes
+    message_type = None  # type: Optional[int]
+
+    if TYPE_CHECKING:
+        # Slots, set in the constructor which bypasses __setattr__
+        size = None  # type: Optional[int]
+        origin = 0
+        tagged = 0
+        addressable = 0
+        protocol = 0
+        source_id = 0
+        target = b""
+        reserved = 0
+        ack_requested = 0
+        response_requested = 0
+        seq_num = 0
+        _packed = None  # type: Optional[bytes]
 
-class Message(object):
     def __init__(
-            self, *, target_addr: str, source_id: int,
+            self, *, target_addr: Union[str, bytes], source_id: int,
             seq_num: int, ack_requested: bool=False, response_requested: bool=False,
             payload: Dict[str, Any]) -> None:
+        set_attr = object.__setattr__
+        target = convert_MAC_to_bytes(target_addr)
 
         # Frame
-        self.frame_format = ["uint:16", "uint:2, bool, bool, uint:12", "uint:32"]
-        self.size = None  # type: Optional[int]                         # 16 bits/uint16
-        self.origin = 0                                                 # 2 bits/uint8, must be zero
-        self.tagged = 1 if target_addr == BROADCAST_MAC else 0          # 1 bit/bool, also must be one if getservice
-        self.addressable = 1                                            # 1 bit/bool, must be one
-        self.protocol = 1024                                            # 12 bits/uint16
+        set_attr(self, "size", None)                                    # 16 bits/uint16, set when received
+        set_attr(self, "origin", 0)                                     # 2 bits/uint8, must be zero
+        # 1 bit/bool, also must be one if getservice
+        set_attr(self, "tagged", 1 if target == BROADCAST_TARGET else 0)
+        set_attr(self, "addressable", 1)                                # 1 bit/bool, must be one
+        set_attr(self, "protocol", 1024)                                # 12 bits/uint16
         # 32 bits/uint32, unique ID set by client.
         # If zero, broadcast reply requested. If non-zero, unicast reply requested.
-        self.source_id = source_id
+        set_attr(self, "source_id", source_id)
 
         # Frame Address
-        self.frame_addr_format = ["uint:64", "uint:48", "uint:6, bool, bool", "uint:8"]
         # 64 bits/uint64, either single MAC address or all zeroes for broadcast.
-        self.target_addr = target_addr
-        self.reserved = 0                                               # 48 bits/uint8 x 6, all zero
-        self.reserved = 0                                               # 6 bits, all zero
-        self.ack_requested = 1 if ack_requested else 0                  # 1 bit/bool, 1 = yes
-        self.response_requested = 1 if response_requested else 0        # 1 bit/bool, 1 = yes
-        self.seq_num = seq_num                                          # 8 bits/uint8, wraparound
-
-        # Protocol Header
-        self.protocol_header_format = ["uint:64", "uint:16", "uint:16"]
-        self.reserved = 0                                               # 64 bits/uint64, all zero
-        self.message_type = None  # type: Optional[int]                 # 16 bits/uint16
-        self.reserved = 0                                               # 16 bits/uint16, all zero
-
-        self.payload_fields = []  # type: List[Tuple[str, Any]]
-
-    def generate_packed_message(self) -> bitstring.BitString:
-        self.payload = self.get_payload()
-        self.header = self.get_header()
-        packed_message = self.header + self.payload
+        # Kept as the 6 bytes sent on the wire.
+        set_attr(self, "target", target)
+        # 48 bits/uint8 x 6, 6 bits, 64 bits/uint64 and 16 bits/uint16, all zero
+        set_attr(self, "reserved", 0)
+        set_attr(self, "ack_requested", 1 if ack_requested else 0)              # 1 bit/bool, 1 = yes
+        set_attr(self, "response_requested", 1 if response_requested else 0)    # 1 bit/bool, 1 = yes
+        set_attr(self, "seq_num", seq_num)                                      # 8 bits/uint8, wraparound
+
+        # Packed bytes, filled in on first use
+        set_attr(self, "_packed", None)
+
+        # Payload
+        for field in self.schema.fields:
+            if field.name in payload:
+                set_attr(self, field.name, payload[field.name])
+            elif field.default is not None:
+                set_attr(self, field.name, field.default)
+            else:
+                raise KeyError(field.name)
+
+    if TYPE_CHECKING:
+        # Payload fields are set from the schema
+        def __getattr__(self, name: str) -> Any: ...
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def _set_received(self, *, size: int, flags: int) -> None:
+        """ Record the header fields of a received message. """
+        set_attr = object.__setattr__
+        set_attr(self, "size", size)
+        set_attr(self, "origin", (flags >> 14) & 3)
+        set_attr(self, "tagged", (flags >> 13) & 1)
+        set_attr(self, "addressable", (flags >> 12) & 1)
+        set_attr(self, "protocol", flags & 4095)
+
+    @property
+    def target_addr(self) -> str:
+        """ The target MAC address, formatted as a string. """
+        return convert_bytes_to_MAC(self.target)
+
+    @property
+    def header(self) -> bytes:
+        """ The packed header. """
+        return self.generate_packed_message()[:HEADER_SIZE_BYTES]
+
+    @property
+    def payload(self) -> bytes:
+        """ The packed payload. """
+        return self.generate_packed_message()[HEADER_SIZE_BYTES:]
+
+    @property
+    def payload_fields(self) -> List[Tuple[str, Any]]:
+        """ The description and value of each payload field, for display. """
+        return [(field.description, getattr(self, field.name)) for field in self.schema.fields]
+
+    def generate_packed_message(self) -> bytes:
+        """ Return the packed message, encoding it the first time only. """
+        packed_message = self._packed
+        if packed_message is None:
+            payload = self.get_payload()
+            packed_message = self.get_header(len(payload)) + payload
+            object.__setattr__(self, "_packed", packed_message)
         return packed_message
 
     # frame (and thus header) needs to be generated after payload (for size field)
-    def get_header(self) -> bitstring.BitString:
-        if self.size is None:
-            self.size = self.get_msg_size()
-        frame_addr = self.get_frame_addr()
-        frame = self.get_frame()
-        protocol_header = self.get_protocol_header()
-        header = frame + frame_addr + protocol_header
-        return header
-
-    # Default: No payload unless method overridden
-    def get_payload(self) -> bitstring.BitString:
-        return little_endian(bitstring.pack(""))
-
-    def get_frame(self) -> bitstring.BitString:
-        size_format = self.frame_format[0]
-        flags_format = self.frame_format[1]
-        source_id_format = self.frame_format[2]
-        size = little_endian(bitstring.pack(size_format, self.size))
-        flags = little_endian(bitstring.pack(flags_format, self.origin, self.tagged, self.addressable, self.protocol))
-        source_id = little_endian(bitstring.pack(source_id_format, self.source_id))
-        frame = size + flags + source_id
-        return frame
-
-    def get_frame_addr(self) -> bitstring.BitString:
-        mac_addr_format = self.frame_addr_format[0]
-        reserved_48_format = self.frame_addr_format[1]
-        response_flags_format = self.frame_addr_format[2]
-        seq_num_format = self.frame_addr_format[3]
-        mac_addr = little_endian(bitstring.pack(mac_addr_format, convert_MAC_to_int(self.target_addr)))
-        reserved_48 = little_endian(bitstring.pack(reserved_48_format, self.reserved))
-        response_flags = little_endian(bitstring.pack(response_flags_format, self.reserved,
-                                                      self.ack_requested, self.response_requested))
-        seq_num = little_endian(bitstring.pack(seq_num_format, self.seq_num))
-        frame_addr = mac_addr + reserved_48 + response_flags + seq_num
-        return frame_addr
-
-    def get_protocol_header(self) -> bitstring.BitString:
-        reserved_64_format = self.protocol_header_format[0]
-        message_type_format = self.protocol_header_format[1]
-        reserved_16_format = self.protocol_header_format[2]
-        reserved_64 = little_endian(bitstring.pack(reserved_64_format, self.reserved))
-        message_type = little_endian(bitstring.pack(message_type_format, self.message_type))
-        reserved_16 = little_endian(bitstring.pack(reserved_16_format, self.reserved))
-        protocol_header = reserved_64 + message_type + reserved_16
-        return protocol_header
+    def get_header(self, payload_size: Optional[int]=None) -> bytes:
+        size = self.size
+        if size is None:
+            if payload_size is None:
+                payload_size = len(self.get_payload())
+            size = HEADER_SIZE_BYTES + payload_size
+        flags = (self.origin << 14) | (self.tagged << 13) | (self.addressable << 12) | self.protocol
+        response_flags = (self.ack_requested << 1) | self.response_requested
+        return HEADER_STRUCT.pack(
+            size, flags, self.source_id, self.target,
+            response_flags, self.seq_num, self.message_type)
+
+    def get_payload(self) -> bytes:
+        return self.schema.pack(self)
 
     def get_msg_size(self) -> int:
-        payload_size_bytes = len(self.payload)
-        return HEADER_SIZE_BYTES + payload_size_bytes
+        return len(self.generate_packed_message())
 
     def __str__(self) -> str:
         indent = "  "
@@ -129,6 +218,104 @@ class Message(object):
         s += "\n"
         return s
 
+
+class HeaderTemplate(object):
+    """
+    A prebuilt header for sending one message type to one target.
+
+    Everything except the size, the ack/response flags and the sequence
+    number is fixed for a given target, source and message type, so it is
+    packed once and only those bytes are patched for each packet.
+    """
+    __slots__ = ("_header",)
+
+    def __init__(
+            self, msg_type: Type[Message], *,
+            target_addr: Union[str, bytes], source_id: int) -> None:
+        """
+        Pack the fixed part of the header.
+
+        :param msg_type: The type of the messages that will be sent.
+        :param target_addr: The MAC address of the target, as 6 bytes or a string.
+        :param source_id: Our source id.
+        """
+        target = convert_MAC_to_bytes(target_addr)
+        tagged = 1 if target == BROADCAST_TARGET else 0
+        flags = (tagged << 13) | (1 << 12) | 1024
+        self._header = bytearray(HEADER_STRUCT.pack(
+            HEADER_SIZE_BYTES, flags, source_id, target, 0, 0, msg_type.message_type))
+
+    def pack(
+            self, payload: bytes, *, seq_num: int,
+            ack_requested: bool=False, response_requested: bool=False) -> bytes:
+        """
+        Return a complete packet for `payload`.
+
+        :param payload: The packed payload.
+        :param seq_num: The sequence number.
+        :param ack_requested: Should the light acknowledge this message?
+        :param response_requested: Should the light respond to this message?
+        :return: The header followed by the payload.
+        """
+        header = self._header
+        _UINT16.pack_into(header, SIZE_OFFSET, HEADER_SIZE_BYTES + len(payload))
+        header[RESPONSE_FLAGS_OFFSET] = (ack_requested << 1) | response_requested
+        header[SEQ_NUM_OFFSET] = seq_num
+        return bytes(header) + payload
+
+    def pack_message(self, msg: Message) -> bytes:
+        """ Return a complete packet for `msg`, which must match this template. """
+        return self.pack(
+            msg.schema.pack(msg), seq_num=msg.seq_num,
+            ack_requested=bool(msg.ack_requested),
+            response_requested=bool(msg.response_requested))
+
+
+def pack_bulk(
+        msg_type: Type[Message], payload: Dict[str, Any],
+        addresses: Sequence[Tuple[bytes, int, int]], *,
+        ack_requested: bool=False, response_requested: bool=False) -> List[memoryview]:
+    """
+    Pack the same message for many targets, encoding the payload only once.
+
+    The packet is encoded once and copied into one preallocated buffer, then
+    the target, source and sequence number are patched in each copy.
+
+    :param msg_type: The type of the message.
+    :param payload: The payload to send.
+    :param addresses: The target, source id and sequence number of each packet.
+    :param ack_requested: Should the lights acknowledge the message?
+    :param response_requested: Should the lights respond to the message?
+    :return: One packet per address, as views into the shared buffer.
+    """
+    packet = msg_type(
+        target_addr=BROADCAST_TARGET, source_id=0, seq_num=0, payload=payload,
+        ack_requested=ack_requested, response_requested=response_requested,
+    ).generate_packed_message()
+    size = len(packet)
+    buffer = bytearray(packet * len(addresses))
+    offsets = range(0, len(buffer), size)
+    for offset, (target, source_id, seq_num) in zip(offsets, addresses):
+        tagged = 1 if target == BROADCAST_TARGET else 0
+        _ADDRESS_STRUCT.pack_into(
+            buffer, offset + 2, (tagged << 13) | (1 << 12) | 1024, source_id, target)
+        buffer[offset + SEQ_NUM_OFFSET] = seq_num
+    view = memoryview(buffer)
+    return [view[offset:offset + size] for offset in offsets]
+
+
+def unknown_message_type(message_type: int) -> Type[Message]:
+    """ Return a `Message` subclass for a message type id that isn't in msgtypes. """
+    try:
+        return _UNKNOWN_TYPES[message_type]
+    except KeyError:
+        msg_type = cast(
+            Type[Message],
+            MessageMeta("UnknownMessage", (Message,), {"message_type": message_type}))
+        _UNKNOWN_TYPES[message_type] = msg_type
+        return msg_type
+
+
 # reverses bytes for little endian, then converts to int
 
 
@@ -139,10 +326,13 @@ def convert_MAC_to_int(addr: str) -> int:
     return int(addr_str, 16)
 
 
-def little_endian(bs: bitstring.BitString) -> bytes:
-    shifts = [i * 8 for i in range(int(len(bs) / 8))]
-    int_bytes_little_endian = [int(bs.uintbe >> i & 0xff) for i in shifts]
-    packed_message_little_endian = b""
-    for b in int_bytes_little_endian:
-        packed_message_little_endian += struct.pack("B", b)
-    return packed_message_little_endian
+def convert_MAC_to_bytes(addr: Union[str, bytes]) -> bytes:
+    """ Convert a MAC address string to the 6 bytes sent on the wire. """
+    if isinstance(addr, bytes):
+        return addr
+    return bytes.fromhex(addr.replace(":", ""))
+
+
+def convert_bytes_to_MAC(addr: bytes) -> str:
+    """ Format the 6 bytes of a MAC address as a string. """
+    return ":".join(["%02x" % b for b in addr])
@@ -6,900 +6,264 @@
 # particular: Color [0-65535, 0-65535, 0-65535, 2500-9000], Power Level (must be 0 OR 65535)
 # Need to look into assert-type frameworks or something, there has to be a tool for that.
 # Also need to make custom errors possibly, though tool may have those.
-from typing import Any, Dict
+#
+# Each message declares its payload layout once in `schema`; the encoder
+# and the decoder are both generated from it.
+from typing import Dict, Type  # NOQA
 
-import bitstring
-
-from .message import Message, little_endian
+from .message import Message
+from .schema import Field, Schema
 
 # DEVICE MESSAGES
 
 
 class GetService(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        if payload is None:
-            payload = {}
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetService]
+    pass
 
 
 class StateService(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.service = payload["service"]
-        self.port = payload["port"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateService]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Service", self.service))
-        self.payload_fields.append(("Port", self.port))
-        service = little_endian(bitstring.pack("uint:8", self.service))
-        port = little_endian(bitstring.pack("uint:32", self.port))
-        payload = service + port
-        return payload
+    schema = Schema(
+        Field("service", "uint8", description="Service"),
+        Field("port", "uint32", description="Port"),
+    )
 
 
 class GetHostInfo(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetHostInfo]
+    pass
 
 
 class StateHostInfo(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.signal = payload["signal"]
-        self.tx = payload["tx"]
-        self.rx = payload["rx"]
-        self.reserved1 = payload["reserved1"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateHostInfo]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Signal (mW)", self.signal))
-        self.payload_fields.append(("TX (bytes since on)", self.tx))
-        self.payload_fields.append(("RX (bytes since on)", self.rx))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        signal = little_endian(bitstring.pack("float:32", self.signal))
-        tx = little_endian(bitstring.pack("uint:32", self.tx))
-        rx = little_endian(bitstring.pack("uint:32", self.rx))
-        reserved1 = little_endian(bitstring.pack("int:16", self.reserved1))
-        payload = signal + tx + rx + reserved1
-        return payload
+    schema = Schema(
+        Field("signal", "float32", description="Signal (mW)"),
+        Field("tx", "uint32", description="TX (bytes since on)"),
+        Field("rx", "uint32", description="RX (bytes since on)"),
+        Field("reserved1", "int16", description="Reserved", default=0),
+    )
 
 
 class GetHostFirmware(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetHostFirmware]
+    pass
 
 
 class StateHostFirmware(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.build = payload["build"]
-        self.reserved1 = payload["reserved1"]
-        self.version = payload["version"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateHostFirmware]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Timestamp of Build", self.build))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        self.payload_fields.append(("Version", self.version))
-        build = little_endian(bitstring.pack("uint:64", self.build))
-        reserved1 = little_endian(bitstring.pack("uint:64", self.reserved1))
-        version = little_endian(bitstring.pack("uint:32", self.version))
-        payload = build + reserved1 + version
-        return payload
+    schema = Schema(
+        Field("build", "uint64", description="Timestamp of Build"),
+        Field("reserved1", "uint64", description="Reserved", default=0),
+        Field("version", "uint32", description="Version"),
+    )
 
 
 class GetWifiInfo(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetWifiInfo]
+    pass
 
 
 class StateWifiInfo(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.signal = payload["signal"]
-        self.tx = payload["tx"]
-        self.rx = payload["rx"]
-        self.reserved1 = payload["reserved1"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateWifiInfo]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Signal (mW)", self.signal))
-        self.payload_fields.append(("TX (bytes since on)", self.tx))
-        self.payload_fields.append(("RX (bytes since on)", self.rx))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        signal = little_endian(bitstring.pack("float:32", self.signal))
-        tx = little_endian(bitstring.pack("uint:32", self.tx))
-        rx = little_endian(bitstring.pack("uint:32", self.rx))
-        reserved1 = little_endian(bitstring.pack("int:16", self.reserved1))
-        payload = signal + tx + rx + reserved1
-        return payload
+    schema = StateHostInfo.schema
 
 
 class GetWifiFirmware(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetWifiFirmware]
+    pass
 
 
 class StateWifiFirmware(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.build = payload["build"]
-        self.reserved1 = payload["reserved1"]
-        self.version = payload["version"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateWifiFirmware]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Timestamp of Build", self.build))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        self.payload_fields.append(("Version", self.version))
-        build = little_endian(bitstring.pack("uint:64", self.build))
-        reserved1 = little_endian(bitstring.pack("uint:64", self.reserved1))
-        version = little_endian(bitstring.pack("uint:32", self.version))
-        payload = build + reserved1 + version
-        return payload
+    schema = StateHostFirmware.schema
 
 
 class GetPower(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetPower]
+    pass
 
 
 class SetPower(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.power_level = payload["power_level"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[SetPower]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Power", self.power_level))
-        power_level = little_endian(bitstring.pack("uint:16", self.power_level))
-        payload = power_level
-        return payload
+    schema = Schema(
+        Field("power_level", "uint16", description="Power"),
+    )
 
 
 class StatePower(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.power_level = payload["power_level"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StatePower]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Power", self.power_level))
-        power_level = little_endian(bitstring.pack("uint:16", self.power_level))
-        payload = power_level
-        return payload
+    schema = SetPower.schema
 
 
 class GetLabel(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetLabel]
+    pass
 
 
 class SetLabel(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.label = payload["label"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[SetLabel]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Label", self.label))
-        field_len_bytes = 32
-        label = b"".join(little_endian(bitstring.pack("uint:8", ord(c))) for c in self.label)
-        padding = b"".join(little_endian(bitstring.pack("uint:8", 0)) for i in range(field_len_bytes - len(self.label)))
-        payload = label + padding
-        return payload
+    schema = Schema(
+        Field("label", "bytes", 32, description="Label"),
+    )
 
 
 class StateLabel(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.label = payload["label"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateLabel]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Label", self.label))
-        field_len_bytes = 32
-        label = b"".join(little_endian(bitstring.pack("uint:8", c)) for c in self.label)
-        padding = b"".join(little_endian(bitstring.pack("uint:8", 0)) for i in range(field_len_bytes - len(self.label)))
-        payload = label + padding
-        return payload
+    schema = SetLabel.schema
 
 
 class GetVersion(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetVersion]
+    pass
 
 
 class StateVersion(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.vendor = payload["vendor"]
-        self.product = payload["product"]
-        self.version = payload["version"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateVersion]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Vendor", self.vendor))
-        self.payload_fields.append(("Reserved", self.product))
-        self.payload_fields.append(("Version", self.version))
-        vendor = little_endian(bitstring.pack("uint:32", self.vendor))
-        product = little_endian(bitstring.pack("uint:32", self.product))
-        version = little_endian(bitstring.pack("uint:32", self.version))
-        payload = vendor + product + version
-        return payload
+    schema = Schema(
+        Field("vendor", "uint32", description="Vendor"),
+        Field("product", "uint32", description="Product"),
+        Field("version", "uint32", description="Version"),
+    )
 
 
 class GetInfo(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetInfo]
+    pass
 
 
 class StateInfo(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.time = payload["time"]
-        self.uptime = payload["uptime"]
-        self.downtime = payload["downtime"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateInfo]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Current Time", self.time))
-        self.payload_fields.append(("Uptime (ns)", self.uptime))
-        self.payload_fields.append(("Last Downtime Duration (ns) (5 second error)", self.downtime))
-        time = little_endian(bitstring.pack("uint:64", self.time))
-        uptime = little_endian(bitstring.pack("uint:64", self.uptime))
-        downtime = little_endian(bitstring.pack("uint:64", self.downtime))
-        payload = time + uptime + downtime
-        return payload
+    schema = Schema(
+        Field("time", "uint64", description="Current Time"),
+        Field("uptime", "uint64", description="Uptime (ns)"),
+        Field("downtime", "uint64", description="Last Downtime Duration (ns) (5 second error)"),
+    )
 
 
 class GetLocation(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetLocation]
+    pass
 
 
 class StateLocation(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.location = payload["location"]
-        self.label = payload["label"]
-        self.updated_at = payload["updated_at"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateLocation]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Location ", self.location))
-        self.payload_fields.append(("Label ", self.label))
-        self.payload_fields.append(("Updated At ", self.updated_at))
-        location = b"".join(little_endian(bitstring.pack("uint:8", b)) for b in self.location)
-        label = b"".join(little_endian(bitstring.pack("uint:8", c)) for c in self.label)
-        label_padding = b"".join(little_endian(bitstring.pack("uint:8", 0)) for i in range(32 - len(self.label)))
-        label += label_padding
-        updated_at = little_endian(bitstring.pack("uint:64", self.updated_at))
-        payload = location + label + updated_at
-        return payload
+    schema = Schema(
+        Field("location", "uint8", 16, description="Location"),
+        Field("label", "bytes", 32, description="Label"),
+        Field("updated_at", "uint64", description="Updated At"),
+    )
 
 
 class GetGroup(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[GetGroup]
+    pass
 
 
 class StateGroup(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.group = payload["group"]
-        self.label = payload["label"]
-        self.updated_at = payload["updated_at"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[StateGroup]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Group ", self.group))
-        self.payload_fields.append(("Label ", self.label))
-        self.payload_fields.append(("Updated At ", self.updated_at))
-        group = b"".join(little_endian(bitstring.pack("uint:8", b)) for b in self.group)
-        label = b"".join(little_endian(bitstring.pack("uint:8", c)) for c in self.label)
-        label_padding = b"".join(little_endian(bitstring.pack("uint:8", 0)) for i in range(32 - len(self.label)))
-        label += label_padding
-        updated_at = little_endian(bitstring.pack("uint:64", self.updated_at))
-        payload = group + label + updated_at
-        return payload
+    schema = Schema(
+        Field("group", "uint8", 16, description="Group"),
+        Field("label", "bytes", 32, description="Label"),
+        Field("updated_at", "uint64", description="Updated At"),
+    )
 
 
 class Acknowledgement(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[Acknowledgement]
+    pass
 
 
 class EchoRequest(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.byte_array = payload["byte_array"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[EchoRequest]
-
-    def get_payload(self) -> bytes:
-        field_len = 64
-        self.payload_fields.append(("Byte Array", self.byte_array))
-        byte_array = b"".join(little_endian(bitstring.pack("uint:8", b)) for b in self.byte_array)
-        byte_array_len = len(byte_array)
-        if byte_array_len < field_len:
-            byte_array += b"".join(little_endian(bitstring.pack("uint:8", 0))
-                                   for i in range(field_len - byte_array_len))
-        elif byte_array_len > field_len:
-            byte_array = byte_array[:field_len]
-        payload = byte_array
-        return payload
+    schema = Schema(
+        Field("byte_array", "bytes", 64, description="Byte Array"),
+    )
 
 
 class EchoResponse(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.byte_array = payload["byte_array"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[EchoResponse]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Byte Array", self.byte_array))
-        byte_array = b"".join(little_endian(bitstring.pack("uint:8", b)) for b in self.byte_array)
-        payload = byte_array
-        return payload
+    schema = Schema(
+        Field("byte_array", "bytes", None, description="Byte Array"),
+    )
 
 
 # LIGHT MESSAGES
 
 
 class LightGet(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightGet]
+    pass
 
 
 class LightSetColor(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.color = payload["color"]
-        self.duration = payload["duration"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightSetColor]
-
-    def get_payload(self) -> bytes:
-        reserved_8 = little_endian(bitstring.pack("uint:8", self.reserved))
-        color = b"".join(little_endian(bitstring.pack("uint:16", field)) for field in self.color)
-        duration = little_endian(bitstring.pack("uint:32", self.duration))
-        payload = reserved_8 + color + duration
-        # payloadUi = " ".join("{:02x}".format(c) for c in payload)
-        return payload
+    schema = Schema(
+        Field("reserved", "uint8", description="Reserved", default=0),
+        Field("color", "hsbk", description="Color (HSBK)"),
+        Field("duration", "uint32", description="Duration (ms)"),
+    )
 
 
 class LightSetWaveform(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.transient = payload["transient"]
-        self.color = payload["color"]
-        self.period = payload["period"]
-        self.cycles = payload["cycles"]
-        self.duty_cycle = payload["duty_cycle"]
-        self.waveform = payload["waveform"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightSetWaveform]
-
-    def get_payload(self) -> bytes:
-        reserved_8 = little_endian(bitstring.pack("uint:8", self.reserved))
-        transient = little_endian(bitstring.pack("uint:8", self.transient))
-        color = b"".join(little_endian(bitstring.pack("uint:16", field)) for field in self.color)
-        period = little_endian(bitstring.pack("uint:32", self.period))
-        cycles = little_endian(bitstring.pack("float:32", self.cycles))
-        duty_cycle = little_endian(bitstring.pack("int:16", self.duty_cycle))
-        waveform = little_endian(bitstring.pack("uint:8", self.waveform))
-        payload = reserved_8 + transient + color + period + cycles + duty_cycle + waveform
-        # payloadUi = " ".join("{:02x}".format(c) for c in payload)
-        return payload
+    schema = Schema(
+        Field("reserved", "uint8", description="Reserved", default=0),
+        Field("transient", "uint8", description="Transient"),
+        Field("color", "hsbk", description="Color (HSBK)"),
+        Field("period", "uint32", description="Period (ms)"),
+        Field("cycles", "float32", description="Cycles"),
+        Field("duty_cycle", "int16", description="Duty Cycle"),
+        Field("waveform", "uint8", description="Waveform"),
+    )
 
 
 class LightState(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.color = payload["color"]
-        self.reserved1 = payload["reserved1"]
-        self.power_level = payload["power_level"]
-        self.label = payload["label"]
-        self.reserved2 = payload["reserved2"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightState]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Color (HSBK)", self.color))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        self.payload_fields.append(("Power Level", self.power_level))
-        self.payload_fields.append(("Label", self.label))
-        self.payload_fields.append(("Reserved", self.reserved2))
-        color = b"".join(little_endian(bitstring.pack("uint:16", field)) for field in self.color)
-        reserved1 = little_endian(bitstring.pack("int:16", self.reserved1))
-        power_level = little_endian(bitstring.pack("uint:16", self.power_level))
-        label = b"".join(little_endian(bitstring.pack("uint:8", c)) for c in self.label)
-        label_padding = b"".join(little_endian(bitstring.pack("uint:8", 0)) for i in range(32 - len(self.label)))
-        label += label_padding
-        reserved2 = little_endian(bitstring.pack("uint:64", self.reserved1))
-        payload = color + reserved1 + power_level + label + reserved2
-        return payload
+    schema = Schema(
+        Field("color", "hsbk", description="Color (HSBK)"),
+        Field("reserved1", "int16", description="Reserved", default=0),
+        Field("power_level", "uint16", description="Power Level"),
+        Field("label", "bytes", 32, description="Label"),
+        Field("reserved2", "uint64", description="Reserved", default=0),
+    )
 
 
 class LightGetPower(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightGetPower]
+    pass
 
 
 class LightSetPower(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.power_level = payload["power_level"]
-        self.duration = payload["duration"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightSetPower]
-
-    def get_payload(self) -> bytes:
-        power_level = little_endian(bitstring.pack("uint:16", self.power_level))
-        duration = little_endian(bitstring.pack("uint:32", self.duration))
-        payload = power_level + duration
-        return payload
+    schema = Schema(
+        Field("power_level", "uint16", description="Power Level"),
+        Field("duration", "uint32", description="Duration (ms)"),
+    )
 
 
 class LightStatePower(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.power_level = payload["power_level"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightStatePower]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Power Level", self.power_level))
-        power_level = little_endian(bitstring.pack("uint:16", self.power_level))
-        payload = power_level
-        return payload
+    schema = Schema(
+        Field("power_level", "uint16", description="Power Level"),
+    )
 
 # INFRARED MESSAGES
 
 
 class LightGetInfrared(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightGetInfrared]
+    pass
 
 
 class LightStateInfrared(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.infrared_brightness = payload["infrared_brightness"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightStateInfrared]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Infrared Brightness", self.infrared_brightness))
-        infrared_brightness = little_endian(bitstring.pack("uint:16", self.infrared_brightness))
-        payload = infrared_brightness
-        return payload
+    schema = Schema(
+        Field("infrared_brightness", "uint16", description="Infrared Brightness"),
+    )
 
 
 class LightSetInfrared(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.infrared_brightness = payload["infrared_brightness"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[LightSetInfrared]
-
-    def get_payload(self) -> bytes:
-        infrared_brightness = little_endian(bitstring.pack("uint:16", self.infrared_brightness))
-        payload = infrared_brightness
-        return payload
+    schema = LightStateInfrared.schema
 
 # MULTIZONE MESSAGES
 
 
 class MultiZoneStateMultiZone(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.count = payload["count"]
-        self.index = payload["index"]
-        self.color = payload["color"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[MultiZoneStateMultiZone]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Count", self.count))
-        self.payload_fields.append(("Index", self.index))
-        self.payload_fields.append(("Color (HSBK)", self.color))
-        count = little_endian(bitstring.pack("uint:8", self.count))
-        index = little_endian(bitstring.pack("uint:8", self.index))
-        payload = count + index
-        for color in self.color:
-            payload += b"".join(little_endian(bitstring.pack("uint:16", field)) for field in color)
-        return payload
+    schema = Schema(
+        Field("count", "uint8", description="Count"),
+        Field("index", "uint8", description="Index"),
+        Field("color", "hsbk", 8, description="Color (HSBK)"),
+    )
 
 
 class MultiZoneStateZone(Message):  # 503
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.count = payload["count"]
-        self.index = payload["index"]
-        self.color = payload["color"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[MultiZoneStateZone]
-
-    def get_payload(self) -> bytes:
-        self.payload_fields.append(("Count", self.count))
-        self.payload_fields.append(("Index", self.index))
-        self.payload_fields.append(("Color (HSBK)", self.color))
-        count = little_endian(bitstring.pack("uint:8", self.count))
-        index = little_endian(bitstring.pack("uint:8", self.index))
-        color = b"".join(little_endian(bitstring.pack("uint:16", field)) for field in self.color)
-        payload = count + index + color
-        return payload
+    schema = Schema(
+        Field("count", "uint8", description="Count"),
+        Field("index", "uint8", description="Index"),
+        Field("color", "hsbk", description="Color (HSBK)"),
+    )
 
 
 class MultiZoneSetColorZones(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.start_index = payload["start_index"]
-        self.end_index = payload["end_index"]
-        self.color = payload["color"]
-        self.duration = payload["duration"]
-        self.apply = payload["apply"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[MultiZoneSetColorZones]
-
-    def get_payload(self) -> bytes:
-        start_index = little_endian(bitstring.pack("uint:8", self.start_index))
-        end_index = little_endian(bitstring.pack("uint:8", self.end_index))
-        color = b"".join(little_endian(bitstring.pack("uint:16", field)) for field in self.color)
-        duration = little_endian(bitstring.pack("uint:32", self.duration))
-        apply = little_endian(bitstring.pack("uint:8", self.apply))
-        payload = start_index + end_index + color + duration + apply
-        return payload
+    schema = Schema(
+        Field("start_index", "uint8", description="Start Index"),
+        Field("end_index", "uint8", description="End Index"),
+        Field("color", "hsbk", description="Color (HSBK)"),
+        Field("duration", "uint32", description="Duration (ms)"),
+        Field("apply", "uint8", description="Apply"),
+    )
 
 
 class MultiZoneGetColorZones(Message):
-    def __init__(
-            self, *, target_addr: str, source_id: int, seq_num: int,
-            payload: Dict[str, Any],
-            ack_requested: bool=False, response_requested: bool=False) -> None:
-
-        self.start_index = payload["start_index"]
-        self.end_index = payload["end_index"]
-        super().__init__(
-            target_addr=target_addr, source_id=source_id,
-            seq_num=seq_num,
-            ack_requested=ack_requested, response_requested=response_requested,
-            payload=payload)
-        self.message_type = MSG_IDS[MultiZoneGetColorZones]
-
-    def get_payload(self) -> bytes:
-        start_index = little_endian(bitstring.pack("uint:8", self.start_index))
-        end_index = little_endian(bitstring.pack("uint:8", self.end_index))
-        payload = start_index + end_index
-        return payload
+    schema = Schema(
+        Field("start_index", "uint8", description="Start Index"),
+        Field("end_index", "uint8", description="End Index"),
+    )
 
 
 MSG_IDS = {GetService: 2,
@@ -944,6 +308,12 @@ MSG_IDS = {GetService: 2,
            MultiZoneStateZone: 503,
            MultiZoneStateMultiZone: 506}
 
+for _msg_type, _msg_id in MSG_IDS.items():
+    _msg_type.message_type = _msg_id
+
+# Decoder registry, keyed by message type id
+MSG_TYPES = {msg_id: msg_type for msg_type, msg_id in MSG_IDS.items()}  # type: Dict[int, Type[Message]]
+
 SERVICE_IDS = {1: "UDP",
                2: "reserved",
                3: "reserved",
@@ -0,0 +1,212 @@
+""" One UDP socket shared by every light.
+
+Lights used to open a connected datagram endpoint each, which costs a file
+descriptor, a selector registration and a protocol object per bulb. A
+:class:`Multiplexer` owns a single unconnected socket, sends with ``sendto``
+and routes each reply to the waiting light by the source id and target MAC
+address in its header. The light then matches the sequence number. The
+socket is closed when the last light leaves; `close_multiplexers` closes
+them all, for example before closing the event loop.
+"""
+import asyncio as aio
+import logging
+import struct
+from typing import (TYPE_CHECKING, Any, Dict, Optional, Text, Tuple,  # NOQA
+                    Union, cast)
+
+from .message import HEADER_SIZE_BYTES
+
+if TYPE_CHECKING:
+    from .aiolifx import Light  # NOQA
+
+Address = Tuple[str, int]
+Datagram = Union[bytes, memoryview]
+
+# Source id and target MAC address, starting at byte 4
+_ROUTE_STRUCT = struct.Struct("<I6s")
+
+logger = logging.getLogger(__name__)
+
+# Shared multiplexers, by event loop and address family. A multiplexer is
+# removed when its socket closes, so a closed loop isn't kept alive.
+_MULTIPLEXERS = {}  # type: Dict[Tuple[aio.AbstractEventLoop, int], Multiplexer]
+
+
+def get_multiplexer(loop: aio.AbstractEventLoop, family: int) -> 'Multiplexer':
+    """
+    Get the multiplexer shared by all lights on `loop` for an address family.
+
+    :param loop: The asyncio event loop.
+    :param family: The address family, ``socket.AF_INET`` or ``socket.AF_INET6``.
+    :return: The shared multiplexer, created on first use.
+    """
+    try:
+        return _MULTIPLEXERS[(loop, family)]
+    except KeyError:
+        multiplexer = Multiplexer(loop=loop, family=family)
+        _MULTIPLEXERS[(loop, family)] = multiplexer
+        return multiplexer
+
+
+def close_multiplexers(loop: aio.AbstractEventLoop) -> None:
+    """
+    Close every socket shared by lights on `loop`. The lights are cleaned up.
+
+    :param loop: The asyncio event loop.
+    """
+    for (multiplexer_loop, family), multiplexer in list(_MULTIPLEXERS.items()):
+        if multiplexer_loop is loop:
+            multiplexer.close()
+
+
+class LightTransport(object):
+    """ The part of a shared socket used by one light. """
+
+    def __init__(self, multiplexer: 'Multiplexer', light: 'Light', addr: Address) -> None:
+        """
+        Create a transport sending to `addr` through `multiplexer`.
+
+        :param multiplexer: The shared socket.
+        :param light: The light receiving the replies.
+        :param addr: The IP address and port of the light.
+        """
+        self._multiplexer = multiplexer
+        self._light = light
+        self._addr = addr
+
+    def sendto(self, data: Datagram, addr: Optional[Address]=None) -> None:
+        """ Send a packet to the light. """
+        self._multiplexer.sendto(data, addr or self._addr)
+
+    def close(self) -> None:
+        """ Stop routing replies to the light. The shared socket is closed after the last light. """
+        self._multiplexer.unregister(self._light)
+
+    def get_extra_info(self, name: str, default: Any=None) -> Any:
+        return self._multiplexer.get_extra_info(name, default)
+
+
+class Multiplexer(aio.DatagramProtocol):
+    """ A UDP socket shared by many lights. """
+
+    def __init__(self, *, loop: aio.AbstractEventLoop, family: int) -> None:
+        """
+        Create a multiplexer. The socket is opened by the first `connect`.
+
+        :param loop: The asyncio event loop.
+        :param family: The address family of the socket.
+        """
+        self._loop = loop
+        self._family = family
+        self._transport = None  # type: Optional[aio.DatagramTransport]
+        self._opening = None  # type: Optional[aio.Future]
+        # Key is (source id, MAC address)
+        self._lights = {}  # type: Dict[Tuple[int, bytes], Light]
+        self._unrouted = 0
+        self._closed = False
+
+    @property
+    def unrouted(self) -> int:
+        """ Return how many received packets did not belong to any light. """
+        return self._unrouted
+
+    def __len__(self) -> int:
+        return len(self._lights)
+
+    async def connect(self, light: 'Light', addr: Address) -> LightTransport:
+        """
+        Route replies for `light` and return a transport that sends to it.
+
+        :param light: The light to register.
+        :param addr: The IP address and port of the light.
+        :return: The transport for the light.
+        """
+        if self._closed:
+            return await get_multiplexer(self._loop, self._family).connect(light, addr)
+        if self._transport is None:
+            if self._opening is None:
+                self._opening = aio.ensure_future(
+                    self._loop.create_datagram_endpoint(lambda: self, family=self._family),
+                    loop=self._loop)
+            try:
+                # Don't let one light cancelling cancel the socket for everyone
+                await aio.shield(self._opening, loop=self._loop)
+            except OSError:
+                self._shutdown()
+                raise
+            if self._closed:
+                # Closed while opening
+                return await get_multiplexer(self._loop, self._family).connect(light, addr)
+        self._lights[(light._source_id, light.mac)] = light
+        return LightTransport(self, light, addr)
+
+    def unregister(self, light: 'Light') -> None:
+        """ Stop routing replies to `light`. Closes the socket if it was the last light. """
+        key = (light._source_id, light.mac)
+        if self._lights.get(key) is light:
+            del self._lights[key]
+            if not self._lights:
+                self.close()
+
+    def sendto(self, data: Datagram, addr: Address) -> None:
+        """ Send a packet, if the socket is open. """
+        if self._transport is None:
+            logger.warning("Dropped packet to %s, socket is closed", addr)
+            return
+        self._transport.sendto(data, addr)
+
+    def get_extra_info(self, name: str, default: Any=None) -> Any:
+        if self._transport is None:
+            return default
+        return self._transport.get_extra_info(name, default)
+
+    def close(self) -> None:
+        """ Close the socket. Registered lights are cleaned up. """
+        transport = self._transport
+        self._shutdown()
+        if transport is not None:
+            transport.close()
+
+    def _shutdown(self) -> None:
+        """ Forget the socket and the lights. Later lights get a new multiplexer. """
+        self._closed = True
+        key = (self._loop, self._family)
+        if _MULTIPLEXERS.get(key) is self:
+            del _MULTIPLEXERS[key]
+        self._transport = None
+        self._opening = None
+        lights = list(self._lights.values())
+        self._lights = {}
+        for light in lights:
+            light.cleanup()
+
+    #
+    #                            Protocol Methods
+    #
+
+    def connection_made(self, transport: aio.BaseTransport) -> None:
+        """ Called when the socket is opened. """
+        if self._closed:
+            transport.close()
+            return
+        self._transport = cast(aio.DatagramTransport, transport)
+
+    def datagram_received(self, data: Union[bytes, Text], addr: Address) -> None:
+        """ Called when we receive a packet. Pass it on to the light it is for. """
+        assert isinstance(data, bytes)
+        if len(data) < HEADER_SIZE_BYTES:
+            self._unrouted += 1
+            return
+        source_id, target = _ROUTE_STRUCT.unpack_from(data, 4)
+        light = self._lights.get((source_id, target))
+        if light is None:
+            self._unrouted += 1
+            return
+        light.datagram_received(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        logger.warning("Error on shared light socket: %s", exc)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        """ Called when the socket is closed. Lights reconnect when rediscovered. """
+        self._shutdown()
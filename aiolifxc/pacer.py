@@ -0,0 +1,47 @@
+""" Pacing of the packets sent to a light.
+
+LIFX lights handle about 20 messages per second and silently drop what
+they can't keep up with. Every packet sent to a light takes a token from
+its :class:`TokenBucket`; when the bucket is empty the packet waits until
+the bucket refills. Tokens are handed out in the order they are asked for,
+so queued packets keep their order without a lock.
+"""
+import asyncio as aio
+
+DEFAULT_RATE = 20.0  # Messages per second
+DEFAULT_BURST = 5  # Messages sent back to back when the light has been idle
+
+
+class TokenBucket(object):
+    """ A token bucket rate limiter. """
+
+    def __init__(
+            self, *, loop: aio.AbstractEventLoop,
+            rate: float=DEFAULT_RATE, burst: float=DEFAULT_BURST) -> None:
+        """
+        Create a full bucket.
+
+        :param loop: The asyncio event loop, used as the clock.
+        :param rate: Tokens added per second.
+        :param burst: The most tokens the bucket holds.
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("Need rate > 0 and burst >= 1")
+        self._loop = loop
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = loop.time()
+
+    def reserve(self) -> float:
+        """
+        Take a token, waiting in line if there are none left.
+
+        :return: How many seconds to wait before sending.
+        """
+        now = self._loop.time()
+        self._tokens = min(self._tokens + (now - self._updated) * self.rate, self.burst) - 1
+        self._updated = now
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
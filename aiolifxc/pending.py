@@ -0,0 +1,258 @@
+""" Requests waiting for a reply from a light, how many may be in flight, and
+sharing one request between identical callers.
+
+Each request reserves a sequence number in the 8 bit header field and gets
+one ``Future`` that resolves with the reply. Numbers are handed out in turn
+and a number still in use is never handed out again, so a late reply can
+only match the request it was sent for. Replies that don't match a waiting
+request are counted as stale.
+"""
+import asyncio as aio
+import collections
+import logging
+from typing import (TYPE_CHECKING, Any, Awaitable, Callable, Deque,  # NOQA
+                    Dict, Hashable, Optional, Tuple, Type)
+
+from . import msgtypes
+from .message import Message
+
+if TYPE_CHECKING:
+    from .view import MessageView  # NOQA
+
+# Number of sequence numbers in the header
+SEQ_NUM_COUNT = 256
+# Requests in flight to one light at once
+DEFAULT_WINDOW = 8
+
+_ACK_TYPE = msgtypes.MSG_IDS[msgtypes.Acknowledgement]
+
+logger = logging.getLogger(__name__)
+
+
+class PendingRequest(object):
+    """ A request waiting for a reply. """
+    __slots__ = ("seq_num", "response_type", "ack_requested", "future")
+
+    def __init__(self, seq_num: int, future: aio.Future) -> None:
+        self.seq_num = seq_num
+        self.response_type = None  # type: Optional[Type[Message]]
+        self.ack_requested = False
+        self.future = future
+
+
+class PendingTable(object):
+    """ The requests a light is waiting on, by sequence number. """
+
+    def __init__(self, *, loop: aio.AbstractEventLoop) -> None:
+        """
+        Create an empty table.
+
+        :param loop: The asyncio event loop.
+        """
+        self._loop = loop
+        self._seq = 0
+        self._pending = {}  # type: Dict[int, PendingRequest]
+        self._stale = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, seq_num: int) -> bool:
+        return seq_num in self._pending
+
+    @property
+    def stale(self) -> int:
+        """ Return how many replies arrived that no request was waiting for. """
+        return self._stale
+
+    def reserve(self) -> int:
+        """
+        Reserve the next free sequence number.
+
+        :return: The sequence number.
+        """
+        if len(self._pending) >= SEQ_NUM_COUNT:
+            raise RuntimeError("All {} sequence numbers are in use".format(SEQ_NUM_COUNT))
+        seq_num = self._seq
+        while True:
+            seq_num = (seq_num + 1) % SEQ_NUM_COUNT
+            if seq_num not in self._pending:
+                break
+        self._seq = seq_num
+        self._pending[seq_num] = PendingRequest(seq_num, self._loop.create_future())
+        return seq_num
+
+    def expect(
+            self, seq_num: int, response_type: Type[Message],
+            *, ack_requested: bool=False) -> aio.Future:
+        """
+        Wait for a reply of `response_type` to a reserved sequence number.
+
+        :param seq_num: A sequence number from `reserve`.
+        :param response_type: The type of the reply.
+        :param ack_requested: If the request asked for an ACK as well as the reply.
+        :return: A future resolved with the `MessageView` of the reply.
+        """
+        try:
+            request = self._pending[seq_num]
+        except KeyError:
+            raise RuntimeError("Sequence number {} was not reserved".format(seq_num))
+        if request.response_type is not None:
+            raise RuntimeError("Sequence number {} is already in use".format(seq_num))
+        request.response_type = response_type
+        request.ack_requested = ack_requested
+        return request.future
+
+    def release(self, seq_num: int) -> None:
+        """ Forget a request, after it was answered or given up. """
+        request = self._pending.pop(seq_num, None)
+        if request is not None and not request.future.done():
+            request.future.cancel()
+
+    def resolve(self, view: 'MessageView') -> bool:
+        """
+        Pass a reply to the request waiting for it.
+
+        :param view: The received reply.
+        :return: False if no request was waiting for it.
+        """
+        request = self._pending.get(view.seq_num)
+        if (request is not None and request.ack_requested and
+                request.response_type is not msgtypes.Acknowledgement and
+                view.message_type == _ACK_TYPE and not request.future.done()):
+            # The ACK that comes before the reply
+            return True
+        if (request is None or request.response_type is None or
+                request.future.done() or
+                view.message_type != request.response_type.message_type):
+            self._stale += 1
+            logger.debug("Stale reply %r", view)
+            return False
+        request.future.set_result(view)
+        return True
+
+
+class InFlightWindow(object):
+    """
+    A limit on the requests in flight to one light.
+
+    Requests are let through in the order they ask, up to ``size`` at a time,
+    and their replies can arrive in any order. A request marked as a barrier,
+    usually a Set, waits for nothing but holds back every later request until
+    it is answered, so a Get sent after a Set sees the new state.
+    """
+
+    def __init__(self, *, loop: aio.AbstractEventLoop, size: int=DEFAULT_WINDOW) -> None:
+        """
+        Create an empty window.
+
+        :param loop: The asyncio event loop.
+        :param size: The most requests in flight at once.
+        """
+        if size < 1:
+            raise ValueError("Need size >= 1")
+        self._loop = loop
+        self.size = size
+        self._in_flight = 0
+        self._barriers = 0
+        self._waiters = collections.deque()  # type: Deque[Tuple[aio.Future, bool]]
+
+    @property
+    def in_flight(self) -> int:
+        """ Return how many requests are in flight. """
+        return self._in_flight
+
+    def _can_send(self) -> bool:
+        return self._in_flight < self.size and not self._barriers
+
+    async def acquire(self, *, barrier: bool=False) -> None:
+        """
+        Wait for a place in the window.
+
+        :param barrier: If True, hold back later requests until this one is released.
+        """
+        if self._can_send() and not self._waiters:
+            self._take(barrier)
+            return
+        future = self._loop.create_future()
+        self._waiters.append((future, barrier))
+        try:
+            await future
+        except aio.CancelledError:
+            if not future.cancelled():
+                # Given a place after being cancelled
+                self.release(barrier=barrier)
+            raise
+
+    def release(self, *, barrier: bool=False) -> None:
+        """
+        Give back a place in the window.
+
+        :param barrier: Must match the value given to `acquire`.
+        """
+        self._in_flight -= 1
+        if barrier:
+            self._barriers -= 1
+        while self._waiters and self._can_send():
+            future, waiter_barrier = self._waiters.popleft()
+            if not future.done():
+                self._take(waiter_barrier)
+                future.set_result(None)
+
+    def _take(self, barrier: bool) -> None:
+        self._in_flight += 1
+        if barrier:
+            self._barriers += 1
+
+
+class SingleFlight(object):
+    """
+    Share one request between callers asking the same question at once.
+
+    The first caller for a key starts the request and later callers for the
+    same key wait for its result instead of sending their own. The key is
+    forgotten as soon as the request is done, so nothing is cached.
+    """
+
+    def __init__(self, *, loop: aio.AbstractEventLoop) -> None:
+        """
+        Create an empty group.
+
+        :param loop: The asyncio event loop.
+        """
+        self._loop = loop
+        self._flights = {}  # type: Dict[Hashable, aio.Future]
+        self._joined = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    @property
+    def joined(self) -> int:
+        """ Return how many callers got the result of a request started by another caller. """
+        return self._joined
+
+    async def run(self, key: Hashable, request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Get the result of the request for `key`, starting it if none is in flight.
+
+        :param key: Identifies the question. Calls with equal keys share a request.
+        :param request: Called to start the request, if needed.
+        :return: The result of the request.
+        """
+        future = self._flights.get(key)
+        if future is None:
+            future = aio.ensure_future(request(), loop=self._loop)
+            self._flights[key] = future
+            future.add_done_callback(lambda done: self._done(key, done))
+        else:
+            self._joined += 1
+        # Cancelling one caller must not cancel the request for the others
+        return await aio.shield(future, loop=self._loop)
+
+    def _done(self, key: Hashable, future: aio.Future) -> None:
+        if self._flights.get(key) is future:
+            del self._flights[key]
+        if not future.cancelled():
+            # Retrieved, even if every caller was cancelled
+            future.exception()
@@ -0,0 +1,74 @@
+""" Retransmission timeouts from measured round trip times.
+
+Each light keeps a smoothed round trip time and its variation, updated the
+way TCP does it (Jacobson/Karels, RFC 6298). The timeout for the first
+attempt of a request is ``srtt + 4 * rttvar``, doubled for every retry and
+kept between a floor and a ceiling. Only replies to the first attempt are
+measured, since a reply after a retry could belong to either send (Karn's
+algorithm).
+"""
+from typing import Optional  # NOQA
+
+# Gains from RFC 6298
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+
+DEFAULT_INITIAL_TIMEOUT = 0.5
+DEFAULT_MIN_TIMEOUT = 0.05
+DEFAULT_MAX_TIMEOUT = 2.0
+
+
+class RttEstimator(object):
+    """ Smoothed round trip time of one light, and the timeout it gives. """
+
+    def __init__(
+            self, *,
+            initial_timeout: float=DEFAULT_INITIAL_TIMEOUT,
+            min_timeout: float=DEFAULT_MIN_TIMEOUT,
+            max_timeout: float=DEFAULT_MAX_TIMEOUT) -> None:
+        """
+        Create an estimator with no measurements.
+
+        :param initial_timeout: The timeout used until the first measurement.
+        :param min_timeout: The shortest timeout to use, in seconds.
+        :param max_timeout: The longest timeout to use, in seconds.
+        """
+        if not 0 < min_timeout <= max_timeout:
+            raise ValueError("Need 0 < min_timeout <= max_timeout")
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.srtt = None  # type: Optional[float]
+        self.rttvar = None  # type: Optional[float]
+
+    def update(self, rtt: float) -> None:
+        """
+        Add a round trip time measurement.
+
+        :param rtt: The time between sending a request and getting the reply.
+        """
+        if self.srtt is None or self.rttvar is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+
+    def timeout(self, attempt: int=0) -> float:
+        """
+        Get the timeout for an attempt.
+
+        :param attempt: The number of earlier attempts of the same request.
+        :return: The timeout in seconds.
+        """
+        if self.srtt is None or self.rttvar is None:
+            timeout = self.initial_timeout
+        else:
+            timeout = self.srtt + K * self.rttvar
+        timeout *= 2 ** attempt
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def __repr__(self) -> str:
+        return "<{} srtt={} rttvar={} timeout={:.3f}>".format(
+            type(self).__name__, self.srtt, self.rttvar, self.timeout())
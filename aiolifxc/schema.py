@@ -0,0 +1,194 @@
+""" Declarative payload layouts for LIFX messages.
+
+Each message type describes its payload once, as a :class:`Schema` made of
+:class:`Field` entries. The schema compiles a single :class:`struct.Struct`
+and uses it for both packing and unpacking, so the encoder and the decoder
+can never disagree about a layout. Compiling is left until the schema is
+first used, so message types that are never sent or received cost nothing
+at import time.
+"""
+import struct
+from struct import Struct
+from typing import (TYPE_CHECKING, Any, Callable, Dict, List, Optional,  # NOQA
+                    Tuple, Union)
+
+# Wire types with a fixed struct format
+SCALAR_FORMATS = {
+    "uint8": "B",
+    "uint16": "H",
+    "uint32": "I",
+    "uint64": "Q",
+    "int16": "h",
+    "float32": "f",
+}
+
+# A colour in HSBK: hue, saturation, brightness and kelvin as uint16
+HSBK_FORMAT = "HHHH"
+
+# Schema attributes built by Schema.compile()
+_COMPILED = frozenset(["struct", "offsets", "_unpackers"])
+
+Unpacker = Callable[[Tuple[Any, ...]], Any]
+
+
+class Field(object):
+    """ One named field of a message payload. """
+
+    def __init__(
+            self, name: str, wire_type: str, count: Optional[int]=1,
+            *, description: Optional[str]=None, default: Any=None) -> None:
+        """
+        Create a new field.
+
+        :param name: The attribute name on the message.
+        :param wire_type: One of ``SCALAR_FORMATS``, ``"hsbk"`` or ``"bytes"``.
+        :param count: Number of repeats, or the length in bytes for ``"bytes"``.
+            ``None`` means a ``"bytes"`` field taking the rest of the payload.
+        :param description: Label used when printing the message.
+        :param default: Value used when the field is missing from the payload.
+        """
+        if wire_type not in SCALAR_FORMATS and wire_type not in ("hsbk", "bytes"):
+            raise ValueError("Unknown wire type {}".format(wire_type))
+        if count is None and wire_type != "bytes":
+            raise ValueError("Only bytes fields can have a variable length")
+        self.name = name
+        self.wire_type = wire_type
+        self.count = count
+        self.description = description or name
+        self.default = default
+
+    @property
+    def format(self) -> str:
+        """ The struct format for this field. """
+        if self.count is None:
+            return ""
+        if self.wire_type == "bytes":
+            return "{}s".format(self.count)
+        if self.wire_type == "hsbk":
+            return HSBK_FORMAT * self.count
+        return SCALAR_FORMATS[self.wire_type] * self.count
+
+    @property
+    def width(self) -> int:
+        """ The number of struct values used by this field. """
+        if self.wire_type == "bytes":
+            return 1
+        if self.wire_type == "hsbk":
+            return 4 * self.count  # type: ignore
+        return self.count  # type: ignore
+
+    def __repr__(self) -> str:
+        return "Field({!r}, {!r}, {!r})".format(self.name, self.wire_type, self.count)
+
+
+def _to_bytes(value: Any) -> bytes:
+    if isinstance(value, str):
+        return value.encode("latin-1")
+    return bytes(value)
+
+
+class Schema(object):
+    """ The payload layout of a message type, with its compiled codec. """
+
+    def __init__(self, *fields: Field) -> None:
+        for field in fields[:-1]:
+            if field.count is None:
+                raise ValueError("Only the last field can have a variable length")
+        self.fields = fields
+        self.names = tuple(field.name for field in fields)
+        self.variable = bool(fields) and fields[-1].count is None
+        self.simple = all(
+            field.wire_type in SCALAR_FORMATS and field.count == 1 for field in fields)
+
+    if TYPE_CHECKING:
+        struct = None  # type: Struct
+        offsets = None  # type: Dict[str, int]
+        _unpackers = None  # type: List[Tuple[str, Unpacker]]
+    else:
+        def __getattr__(self, name: str) -> Any:
+            """ Compile the codec the first time one of its attributes is used. """
+            if name not in _COMPILED:
+                raise AttributeError(name)
+            self.compile()
+            return getattr(self, name)
+
+    def compile(self) -> None:
+        """ Build the struct, field offsets and unpackers for this schema. """
+        self.struct = struct.Struct("<" + "".join(field.format for field in self.fields))
+        self.offsets = self._compile_offsets()
+        self._unpackers = self._compile_unpackers()
+
+    @property
+    def size(self) -> int:
+        """ Size of the fixed part of the payload in bytes. """
+        return self.struct.size
+
+    def _compile_offsets(self) -> Dict[str, int]:
+        """ Return the byte offset of each field within the payload. """
+        offsets = {}  # type: Dict[str, int]
+        fmt = "<"
+        for field in self.fields:
+            offsets[field.name] = struct.calcsize(fmt)
+            fmt += field.format
+        return offsets
+
+    def _compile_unpackers(self) -> List[Tuple[str, Unpacker]]:
+        unpackers = []  # type: List[Tuple[str, Unpacker]]
+        start = 0
+        for field in self.fields:
+            if field.count is None:
+                continue
+            end = start + field.width
+            unpackers.append((field.name, _unpacker(field, start, end)))
+            start = end
+        return unpackers
+
+    def pack(self, msg: Any) -> bytes:
+        """ Pack the payload fields of `msg`. """
+        if self.simple:
+            return self.struct.pack(*[getattr(msg, name) for name in self.names])
+        values = []  # type: List[Any]
+        tail = b""
+        for field in self.fields:
+            value = getattr(msg, field.name)
+            if field.wire_type == "bytes":
+                if field.count is None:
+                    tail = _to_bytes(value)
+                else:
+                    values.append(_to_bytes(value))
+            elif field.wire_type == "hsbk" and field.count != 1:
+                if hasattr(value, "ravel"):
+                    # A (count, 4) array of colours
+                    values.extend(value.ravel().tolist())
+                else:
+                    for color in value:
+                        values.extend(color)
+            elif field.wire_type == "hsbk" or field.count != 1:
+                values.extend(value)
+            else:
+                values.append(value)
+        return self.struct.pack(*values) + tail
+
+    def unpack(self, data: Union[bytes, memoryview], offset: int=0) -> Dict[str, Any]:
+        """ Unpack a payload starting at `offset` into a dictionary. """
+        values = self.struct.unpack_from(data, offset)
+        if self.simple:
+            return dict(zip(self.names, values))
+        payload = {name: unpacker(values) for name, unpacker in self._unpackers}
+        if self.variable:
+            payload[self.names[-1]] = bytes(data[offset + self.struct.size:])
+        return payload
+
+    def __repr__(self) -> str:
+        return "Schema({})".format(", ".join(repr(field) for field in self.fields))
+
+
+def _unpacker(field: Field, start: int, end: int) -> Unpacker:
+    """ Return a function that extracts `field` from the unpacked values. """
+    if field.wire_type == "hsbk" and field.count != 1:
+        return lambda values: [values[i:i + 4] for i in range(start, end, 4)]
+    if field.wire_type == "hsbk":
+        return lambda values: values[start:end]
+    if field.wire_type != "bytes" and field.count != 1:
+        return lambda values: list(values[start:end])
+    return lambda values: values[start]
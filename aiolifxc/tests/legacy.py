@@ -0,0 +1,240 @@
+""" Reference bitstring implementation of the LIFX wire encoder.
+
+This is the encoder that :mod:`aiolifxc.message` and :mod:`aiolifxc.msgtypes`
+used before packets were built with precompiled :class:`struct.Struct`
+objects. It lives with the tests because it needs bitstring, which is only
+a test requirement; the tests and the benchmarks use it to compare the two
+encoders byte for byte.
+"""
+import struct
+from typing import Callable, Dict, Sequence
+
+import bitstring
+
+from aiolifxc.message import HEADER_SIZE_BYTES, Message, convert_MAC_to_int
+
+
+def little_endian(bs: bitstring.BitString) -> bytes:
+    shifts = [i * 8 for i in range(int(len(bs) / 8))]
+    int_bytes_little_endian = [int(bs.uintbe >> i & 0xff) for i in shifts]
+    packed_message_little_endian = b""
+    for b in int_bytes_little_endian:
+        packed_message_little_endian += struct.pack("B", b)
+    return packed_message_little_endian
+
+
+def _uint8(value: int) -> bytes:
+    return little_endian(bitstring.pack("uint:8", value))
+
+
+def _uint16(value: int) -> bytes:
+    return little_endian(bitstring.pack("uint:16", value))
+
+
+def _uint32(value: int) -> bytes:
+    return little_endian(bitstring.pack("uint:32", value))
+
+
+def _uint64(value: int) -> bytes:
+    return little_endian(bitstring.pack("uint:64", value))
+
+
+def _int16(value: int) -> bytes:
+    return little_endian(bitstring.pack("int:16", value))
+
+
+def _float32(value: float) -> bytes:
+    return little_endian(bitstring.pack("float:32", value))
+
+
+def _label(label: bytes) -> bytes:
+    packed = b"".join(_uint8(c) for c in label)
+    padding = b"".join(_uint8(0) for i in range(32 - len(label)))
+    return packed + padding
+
+
+def _service(msg: Message) -> bytes:
+    return _uint8(msg.service) + _uint32(msg.port)
+
+
+def _host_info(msg: Message) -> bytes:
+    return (
+        _float32(msg.signal) + _uint32(msg.tx) +
+        _uint32(msg.rx) + _int16(msg.reserved1)
+    )
+
+
+def _firmware(msg: Message) -> bytes:
+    return _uint64(msg.build) + _uint64(msg.reserved1) + _uint32(msg.version)
+
+
+def _power(msg: Message) -> bytes:
+    return _uint16(msg.power_level)
+
+
+def _set_label(msg: Message) -> bytes:
+    label = b"".join(_uint8(ord(c)) for c in msg.label)
+    padding = b"".join(_uint8(0) for i in range(32 - len(msg.label)))
+    return label + padding
+
+
+def _state_label(msg: Message) -> bytes:
+    return _label(msg.label)
+
+
+def _version(msg: Message) -> bytes:
+    return _uint32(msg.vendor) + _uint32(msg.product) + _uint32(msg.version)
+
+
+def _info(msg: Message) -> bytes:
+    return _uint64(msg.time) + _uint64(msg.uptime) + _uint64(msg.downtime)
+
+
+def _location(msg: Message) -> bytes:
+    location = b"".join(_uint8(b) for b in msg.location)
+    return location + _label(msg.label) + _uint64(msg.updated_at)
+
+
+def _group(msg: Message) -> bytes:
+    group = b"".join(_uint8(b) for b in msg.group)
+    return group + _label(msg.label) + _uint64(msg.updated_at)
+
+
+def _echo_request(msg: Message) -> bytes:
+    field_len = 64
+    byte_array = b"".join(_uint8(b) for b in msg.byte_array)
+    byte_array_len = len(byte_array)
+    if byte_array_len < field_len:
+        byte_array += b"".join(_uint8(0) for i in range(field_len - byte_array_len))
+    elif byte_array_len > field_len:
+        byte_array = byte_array[:field_len]
+    return byte_array
+
+
+def _echo_response(msg: Message) -> bytes:
+    return b"".join(_uint8(b) for b in msg.byte_array)
+
+
+def _color(color: Sequence[int]) -> bytes:
+    return b"".join(_uint16(field) for field in color)
+
+
+def _light_set_color(msg: Message) -> bytes:
+    return _uint8(msg.reserved) + _color(msg.color) + _uint32(msg.duration)
+
+
+def _light_set_waveform(msg: Message) -> bytes:
+    return (
+        _uint8(msg.reserved) + _uint8(msg.transient) + _color(msg.color) +
+        _uint32(msg.period) + _float32(msg.cycles) +
+        _int16(msg.duty_cycle) + _uint8(msg.waveform)
+    )
+
+
+def _light_state(msg: Message) -> bytes:
+    # Note: reserved2 was always encoded from reserved1 here.
+    return (
+        _color(msg.color) + _int16(msg.reserved1) + _uint16(msg.power_level) +
+        _label(msg.label) + _uint64(msg.reserved1)
+    )
+
+
+def _light_set_power(msg: Message) -> bytes:
+    return _uint16(msg.power_level) + _uint32(msg.duration)
+
+
+def _infrared(msg: Message) -> bytes:
+    return _uint16(msg.infrared_brightness)
+
+
+def _state_multi_zone(msg: Message) -> bytes:
+    payload = _uint8(msg.count) + _uint8(msg.index)
+    for color in msg.color:
+        payload += _color(color)
+    return payload
+
+
+def _state_zone(msg: Message) -> bytes:
+    return _uint8(msg.count) + _uint8(msg.index) + _color(msg.color)
+
+
+def _set_color_zones(msg: Message) -> bytes:
+    return (
+        _uint8(msg.start_index) + _uint8(msg.end_index) +
+        _color(msg.color) + _uint32(msg.duration) + _uint8(msg.apply)
+    )
+
+
+def _get_color_zones(msg: Message) -> bytes:
+    return _uint8(msg.start_index) + _uint8(msg.end_index)
+
+
+PAYLOADS = {
+    "StateService": _service,
+    "StateHostInfo": _host_info,
+    "StateHostFirmware": _firmware,
+    "StateWifiInfo": _host_info,
+    "StateWifiFirmware": _firmware,
+    "SetPower": _power,
+    "StatePower": _power,
+    "SetLabel": _set_label,
+    "StateLabel": _state_label,
+    "StateVersion": _version,
+    "StateInfo": _info,
+    "StateLocation": _location,
+    "StateGroup": _group,
+    "EchoRequest": _echo_request,
+    "EchoResponse": _echo_response,
+    "LightSetColor": _light_set_color,
+    "LightSetWaveform": _light_set_waveform,
+    "LightState": _light_state,
+    "LightSetPower": _light_set_power,
+    "LightStatePower": _power,
+    "LightStateInfrared": _infrared,
+    "LightSetInfrared": _infrared,
+    "MultiZoneStateMultiZone": _state_multi_zone,
+    "MultiZoneStateZone": _state_zone,
+    "MultiZoneSetColorZones": _set_color_zones,
+    "MultiZoneGetColorZones": _get_color_zones,
+}  # type: Dict[str, Callable[[Message], bytes]]
+
+
+def get_payload(msg: Message) -> bytes:
+    """ Encode the payload of `msg` with bitstring. """
+    encoder = PAYLOADS.get(type(msg).__name__)
+    if encoder is None:
+        return little_endian(bitstring.pack(""))
+    return encoder(msg)
+
+
+def get_header(msg: Message, payload_size: int) -> bytes:
+    """ Encode the 36 byte header of `msg` with bitstring. """
+    if msg.size is None:
+        msg_size = HEADER_SIZE_BYTES + payload_size
+    else:
+        msg_size = msg.size
+    size = little_endian(bitstring.pack("uint:16", msg_size))
+    flags = little_endian(bitstring.pack(
+        "uint:2, bool, bool, uint:12", msg.origin, msg.tagged, msg.addressable, msg.protocol))
+    source_id = little_endian(bitstring.pack("uint:32", msg.source_id))
+    frame = size + flags + source_id
+
+    mac_addr = little_endian(bitstring.pack("uint:64", convert_MAC_to_int(msg.target_addr)))
+    reserved_48 = little_endian(bitstring.pack("uint:48", 0))
+    response_flags = little_endian(bitstring.pack(
+        "uint:6, bool, bool", 0, msg.ack_requested, msg.response_requested))
+    seq_num = little_endian(bitstring.pack("uint:8", msg.seq_num))
+    frame_addr = mac_addr + reserved_48 + response_flags + seq_num
+
+    reserved_64 = little_endian(bitstring.pack("uint:64", 0))
+    message_type = little_endian(bitstring.pack("uint:16", msg.message_type))
+    reserved_16 = little_endian(bitstring.pack("uint:16", 0))
+    protocol_header = reserved_64 + message_type + reserved_16
+
+    return frame + frame_addr + protocol_header
+
+
+def generate_packed_message(msg: Message) -> bytes:
+    """ Encode `msg` exactly the way the bitstring encoder did. """
+    payload = get_payload(msg)
+    return get_header(msg, len(payload)) + payload
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Conformance tests against the golden packet corpus in ``golden/``.
+
+Each message type has a known-good packet, ``golden/<type>.bin``, encoded
+with the bitstring reference encoder in :mod:`aiolifxc.tests.legacy`, and the
+fields it was encoded from in ``golden/fields.json``. The fields are taken
+from the message given to the encoder, never from a decoder. Any codec must encode the
+fields to exactly those bytes and decode the bytes to exactly those fields.
+
+To regenerate the corpus after adding a message type, run::
+
+    python -m aiolifxc.tests.test_golden
+"""
+import json
+import os
+import random
+import struct
+from typing import Any, Callable, Dict, List, Tuple, Type  # NOQA
+
+from aiolifxc import msgtypes
+from aiolifxc.message import HeaderTemplate, Message, pack_bulk
+from aiolifxc.schema import Field, _to_bytes
+from aiolifxc.unpack import unpack_lifx_message
+from aiolifxc.view import MessageView
+
+from . import legacy
+from .test_message import PAYLOADS
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+FIELDS_FILE = os.path.join(GOLDEN_DIR, "fields.json")
+
+HEADER_FIELDS = (
+    "size", "origin", "tagged", "addressable", "protocol", "source_id", "target_addr",
+    "ack_requested", "response_requested", "seq_num", "message_type",
+)
+
+# Random messages per type in the property tests
+EXAMPLES = 30
+
+
+def _to_json(value: Any) -> Any:
+    """ Convert a decoded field to JSON; bytes become hex strings. """
+    if isinstance(value, bytes):
+        return value.hex()
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    return value
+
+
+def _from_json(field: Field, value: Any) -> Any:
+    """ Convert a JSON field back to what the decoder returns. """
+    if field.wire_type == "bytes":
+        return bytes.fromhex(value)
+    if field.wire_type == "hsbk" and field.count == 1:
+        return tuple(value)
+    if field.wire_type == "hsbk":
+        return [tuple(color) for color in value]
+    return value
+
+
+def _header(msg_type: Type[Message], index: int) -> Dict[str, Any]:
+    """ Vary the header fields over the corpus. """
+    return {
+        "target_addr": "00:00:00:00:00:00" if msg_type is msgtypes.GetService else "d0:73:d5:12:34:56",
+        "source_id": 0x12345678 + index,
+        "seq_num": index * 7 % 256,
+        "ack_requested": index % 2 == 0,
+        "response_requested": index % 3 == 0,
+    }
+
+
+def _msg_types() -> List[Type[Message]]:
+    """ Return every message type, in the order the corpus was generated in. """
+    return sorted(msgtypes.MSG_IDS, key=msgtypes.MSG_IDS.__getitem__)
+
+
+def _corpus_message(msg_type: Type[Message], index: int) -> Message:
+    """ Return the message the golden packet of `msg_type` was encoded from. """
+    return msg_type(payload=PAYLOADS.get(msg_type, {}), **_header(msg_type, index))
+
+
+def _load_corpus() -> Dict[str, Dict[str, Any]]:
+    with open(FIELDS_FILE) as fields_file:
+        corpus = json.load(fields_file)  # type: Dict[str, Dict[str, Any]]
+    return corpus
+
+
+def _load_packet(name: str) -> bytes:
+    with open(os.path.join(GOLDEN_DIR, name + ".bin"), "rb") as packet_file:
+        return packet_file.read()
+
+
+def _create(msg_type: Type[Message], fields: Dict[str, Any]) -> Message:
+    header = fields["header"]
+    payload = {
+        field.name: _from_json(field, fields["payload"][field.name])
+        for field in msg_type.schema.fields
+    }
+    if msg_type is msgtypes.SetLabel:
+        # The legacy encoder only accepted labels as str
+        payload["label"] = payload["label"].decode("latin-1")
+    return msg_type(
+        target_addr=header["target_addr"], source_id=header["source_id"],
+        seq_num=header["seq_num"], ack_requested=bool(header["ack_requested"]),
+        response_requested=bool(header["response_requested"]),
+        payload=payload)
+
+
+def test_corpus_covers_every_message_type() -> None:
+    corpus = _load_corpus()
+    assert sorted(corpus) == sorted(msg_type.__name__ for msg_type in msgtypes.MSG_IDS)
+
+
+def test_corpus_fields_match_inputs() -> None:
+    """The expected fields are the ones each golden packet was encoded from."""
+    corpus = _load_corpus()
+    for index, msg_type in enumerate(_msg_types()):
+        msg = _corpus_message(msg_type, index)
+        assert corpus[msg_type.__name__] == _fields(msg, _load_packet(msg_type.__name__))
+
+
+def test_decode_golden_packets() -> None:
+    for name, fields in _load_corpus().items():
+        packet = _load_packet(name)
+        msg_type = getattr(msgtypes, name)
+        for decoded in (unpack_lifx_message(packet), MessageView(packet)):
+            for key in HEADER_FIELDS:
+                assert getattr(decoded, key) == fields["header"][key], (name, key)
+            for field in msg_type.schema.fields:
+                expected = _from_json(field, fields["payload"][field.name])
+                assert getattr(decoded, field.name) == expected, (name, field.name)
+        assert type(unpack_lifx_message(packet)) is msg_type
+
+
+def test_encode_golden_packets() -> None:
+    for name, fields in _load_corpus().items():
+        packet = _load_packet(name)
+        msg_type = getattr(msgtypes, name)
+        assert _create(msg_type, fields).generate_packed_message() == packet, name
+        assert legacy.generate_packed_message(_create(msg_type, fields)) == packet, name
+
+
+def _float32(rng: random.Random) -> float:
+    """ Return a random float that survives a round trip through float32. """
+    value = struct.unpack("<f", struct.pack("<f", rng.uniform(-1e6, 1e6)))[0]  # type: float
+    return value
+
+
+def _random_value(rng: random.Random, msg_type: Type[Message], field: Field) -> Any:
+    if field.name.startswith("reserved"):
+        # The legacy encoder wrote LightState.reserved2 from reserved1
+        return 0
+    if field.wire_type == "bytes":
+        value = bytes(rng.randrange(256) for _ in range(rng.randint(0, field.count or 64)))
+        if msg_type is msgtypes.SetLabel:
+            # The legacy encoder only accepted labels as str
+            return value.decode("latin-1")
+        return value
+    if field.wire_type == "hsbk":
+        colors = [tuple(rng.randrange(65536) for _ in range(4)) for _ in range(field.count or 0)]
+        return colors[0] if field.count == 1 else colors
+    if field.wire_type == "float32":
+        return _float32(rng)
+    bits = {"uint8": 8, "uint16": 16, "uint32": 32, "uint64": 64}.get(field.wire_type)
+    if bits is None:
+        return rng.randrange(-32768, 32768)
+    values = [rng.randrange(2 ** bits) for _ in range(field.count or 0)]
+    return values[0] if field.count == 1 else values
+
+
+def _random_message(rng: random.Random, msg_type: Type[Message]) -> Message:
+    return msg_type(
+        target_addr=bytes(rng.randrange(256) for _ in range(6)),
+        source_id=rng.randrange(2 ** 32), seq_num=rng.randrange(256),
+        ack_requested=rng.random() < 0.5, response_requested=rng.random() < 0.5,
+        payload={
+            field.name: _random_value(rng, msg_type, field) for field in msg_type.schema.fields
+        })
+
+
+def test_random_messages_match_legacy_encoder() -> None:
+    """Every encoder produces the legacy bytes, and decoding gives the fields back."""
+    rng = random.Random(1024)
+    for msg_type in msgtypes.MSG_IDS:
+        for _ in range(EXAMPLES):
+            msg = _random_message(rng, msg_type)
+            packet = legacy.generate_packed_message(msg)
+            assert msg.generate_packed_message() == packet, msg_type.__name__
+
+            template = HeaderTemplate(msg_type, target_addr=msg.target, source_id=msg.source_id)
+            assert template.pack_message(msg) == packet, msg_type.__name__
+
+            payload = {field.name: getattr(msg, field.name) for field in msg_type.schema.fields}
+            bulk = pack_bulk(
+                msg_type, payload, [(msg.target, msg.source_id, msg.seq_num)],
+                ack_requested=bool(msg.ack_requested),
+                response_requested=bool(msg.response_requested))
+            assert bulk == [packet], msg_type.__name__
+
+            decoded = unpack_lifx_message(packet)
+            view = MessageView(packet)
+            for key in HEADER_FIELDS:
+                if key != "size":
+                    assert getattr(decoded, key) == getattr(msg, key), (msg_type.__name__, key)
+                    assert getattr(view, key) == getattr(msg, key), (msg_type.__name__, key)
+            for field in msg_type.schema.fields:
+                expected = _expected(msg, field)
+                assert getattr(decoded, field.name) == expected, (msg_type.__name__, field.name)
+                assert getattr(view, field.name) == expected, (msg_type.__name__, field.name)
+
+
+def _expected(msg: Message, field: Field) -> Any:
+    """ Return the value a field of `msg` must decode to, from the value it was built with. """
+    value = getattr(msg, field.name)
+    if field.wire_type == "bytes":
+        value = _to_bytes(value)
+        if field.count is not None:
+            value = value.ljust(field.count, b"\0")
+    elif field.wire_type == "float32":
+        # The nearest float32, as sent on the wire
+        value = struct.unpack("<f", struct.pack("<f", value))[0]
+    return value
+
+
+def _fields(msg: Message, packet: bytes) -> Dict[str, Any]:
+    """ Describe the fields of a corpus packet, without decoding it. """
+    header = {key: getattr(msg, key) for key in HEADER_FIELDS if key != "size"}
+    header["size"] = len(packet)
+    return {
+        "header": {key: _to_json(value) for key, value in header.items()},
+        "payload": {
+            field.name: _to_json(_expected(msg, field)) for field in type(msg).schema.fields
+        },
+    }
+
+
+def main() -> None:
+    """ Regenerate the corpus with the legacy encoder. """
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    corpus = {}  # type: Dict[str, Dict[str, Any]]
+    for index, msg_type in enumerate(_msg_types()):
+        msg = _corpus_message(msg_type, index)
+        packet = legacy.generate_packed_message(msg)
+        with open(os.path.join(GOLDEN_DIR, msg_type.__name__ + ".bin"), "wb") as packet_file:
+            packet_file.write(packet)
+        corpus[msg_type.__name__] = _fields(msg, packet)
+    with open(FIELDS_FILE, "w") as fields_file:
+        json.dump(corpus, fields_file, indent=2, sort_keys=True)
+        fields_file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the import time of `aiolifxc`."""
+import subprocess
+import sys
+from typing import Dict, Set
+
+import pytest
+
+from aiolifxc import msgtypes
+
+# Self time budget for all aiolifxc modules on the codec import path
+IMPORT_BUDGET_US = 50000
+
+# Never imported by the package or the wire codec
+HEAVY_MODULES = ("asyncio", "bitstring", "numpy")
+
+
+def _import_times(statement: str) -> Dict[str, int]:
+    """ Run `statement` in a fresh interpreter and return the self time of each import. """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}  # type: Dict[str, int]
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            times[name.strip()] = int(self_us)
+    return times
+
+
+def _loaded_modules(statement: str) -> Set[str]:
+    """ Run `statement` in a fresh interpreter and return the modules it loaded. """
+    result = subprocess.run(
+        [sys.executable, "-c", statement + "; import sys; print(' '.join(sys.modules))"],
+        stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return set(result.stdout.split())
+
+
+def test_import_budget() -> None:
+    if sys.version_info < (3, 7):
+        pytest.skip("-X importtime needs Python 3.7")
+    times = _import_times("import aiolifxc.msgtypes, aiolifxc.view")
+    assert "aiolifxc.view" in times
+    for name in HEAVY_MODULES:
+        assert name not in times, name
+    total = sum(us for name, us in times.items() if name.split(".")[0] == "aiolifxc")
+    assert total <= IMPORT_BUDGET_US
+
+
+def test_package_exports_are_lazy() -> None:
+    if sys.version_info < (3, 7):
+        pytest.skip("lazy exports need Python 3.7")
+    modules = _loaded_modules("import aiolifxc")
+    assert "aiolifxc.aiolifx" not in modules
+    assert "asyncio" not in modules
+    assert "aiolifxc.aiolifx" in _loaded_modules("from aiolifxc import Lights")
+
+
+def test_schemas_compile_on_first_use() -> None:
+    schema = msgtypes.StateWifiFirmware.schema
+    schema.__dict__.pop("struct", None)
+    assert "struct" not in schema.__dict__
+    assert schema.size == 20
+    assert "struct" in schema.__dict__
+    with pytest.raises(AttributeError):
+        getattr(schema, "no_such_attribute")
@@ -2,8 +2,737 @@
 # -*- coding: utf-8 -*-
 
 """Tests for `aiolifxc` package."""
+import asyncio as aio
+import gc
+import socket
+import struct
+from typing import Any, Dict, Hashable, List, Set, Tuple, Type, Union
+
+import pytest
+
+from aiolifxc import breaker, cache, colors, msgtypes
+from aiolifxc.aiolifx import LifxDiscoveryProtocol, Light, LightOffline, Lights
+from aiolifxc.commands import CommandQueue
+from aiolifxc.message import BROADCAST_MAC, Message
+from aiolifxc.multiplexer import (_MULTIPLEXERS, close_multiplexers,
+                                  get_multiplexer)
+from aiolifxc.pacer import TokenBucket
+from aiolifxc.pending import SEQ_NUM_COUNT, InFlightWindow, PendingTable
+from aiolifxc.rtt import RttEstimator
+from aiolifxc.unpack import unpack_lifx_message
+from aiolifxc.view import MessageView, prefilter
+
+from .test_message import PAYLOADS
+
+MAC = "d0:73:d5:12:34:56"
+ADDR = ("192.0.2.1", 56700)
+
+
+def _packet(msg_type: Any, target_addr: str=MAC, seq_num: int=1, **payload: Any) -> bytes:
+    msg = msg_type(
+        target_addr=target_addr, source_id=1234, seq_num=seq_num, payload=payload)  # type: Message
+    return msg.generate_packed_message()
+
+
+# Replies the fake light sends to messages that ask for a response
+RESPONSES = {
+    msgtypes.GetLabel: msgtypes.StateLabel,
+    msgtypes.GetLocation: msgtypes.StateLocation,
+    msgtypes.GetGroup: msgtypes.StateGroup,
+    msgtypes.GetVersion: msgtypes.StateVersion,
+    msgtypes.GetHostFirmware: msgtypes.StateHostFirmware,
+    msgtypes.GetWifiFirmware: msgtypes.StateWifiFirmware,
+    msgtypes.GetPower: msgtypes.StatePower,
+    msgtypes.LightGet: msgtypes.LightState,
+    msgtypes.LightSetColor: msgtypes.LightState,
+}  # type: Dict[Type[Message], Type[Message]]
+
+
+class FakeTransport(object):
+    """ Record the packets sent to a light, and acknowledge or answer them if asked to. """
+
+    def __init__(self, light: Light, *, loop: aio.AbstractEventLoop, delay: float=0) -> None:
+        self.sent = []  # type: List[bytes]
+        self._light = light
+        self._loop = loop
+        self._delay = delay
+        self.drop = False
+        light.connection_made(self)  # type: ignore
+
+    def _reply(self, msg: Message, reply_type: Type[Message]) -> None:
+        reply = reply_type(
+            target_addr=msg.target, source_id=msg.source_id, seq_num=msg.seq_num,
+            payload=PAYLOADS.get(reply_type, {}))
+        self._loop.call_later(
+            self._delay, self._light.datagram_received, reply.generate_packed_message(), ADDR)
+
+    def sendto(self, data: Union[bytes, memoryview], addr: Any=None) -> None:
+        self.sent.append(bytes(data))
+        if self.drop:
+            return
+        msg = unpack_lifx_message(bytes(data))
+        if msg.ack_requested:
+            self._reply(msg, msgtypes.Acknowledgement)
+        if msg.response_requested and type(msg) in RESPONSES:
+            self._reply(msg, RESPONSES[type(msg)])
+
+    def close(self) -> None:
+        pass
+
+
+class FakeBulb(aio.DatagramProtocol):
+    """ Acknowledge every packet sent to a UDP socket, from any number of lights. """
+
+    def __init__(self) -> None:
+        self.senders = set()  # type: Set[Tuple[str, int]]
+        self.transport = None  # type: Any
+
+    def connection_made(self, transport: aio.BaseTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: Union[bytes, str], addr: Tuple[str, int]) -> None:
+        assert isinstance(data, bytes)
+        self.senders.add(addr)
+        msg = unpack_lifx_message(data)
+        ack = msgtypes.Acknowledgement(
+            target_addr=msg.target, source_id=msg.source_id, seq_num=msg.seq_num, payload={})
+        self.transport.sendto(ack.generate_packed_message(), addr)
 
 
 def test_dummy() -> None:
     """Sample pytest test function with the pytest fixture as an argument."""
     assert True is not False
+
+
+def test_prefilter() -> None:
+    wanted = {msgtypes.MSG_IDS[msgtypes.StateService]}
+    packet = _packet(msgtypes.StateService, service=1, port=56700)
+    assert prefilter(packet, wanted) is None
+    assert prefilter(packet[:35], wanted) == "short"
+    assert prefilter(packet + b"\0", wanted) == "size"
+    assert prefilter(packet[:2] + b"\0\0" + packet[4:], wanted) == "protocol"
+    assert prefilter(_packet(msgtypes.GetService), wanted) == "type"
+
+    # A payload too short for the schema, with a size field to match
+    truncated = struct.pack("<H", len(packet) - 2) + packet[2:-2]
+    assert prefilter(truncated, wanted) == "payload"
+
+
+def test_discovery_counts_filtered_packets() -> None:
+    loop = aio.new_event_loop()
+    try:
+        protocol = LifxDiscoveryProtocol(loop=loop)
+        protocol.datagram_received(b"\0" * 10, ADDR)
+        protocol.datagram_received(_packet(msgtypes.GetService, BROADCAST_MAC), ADDR)
+        protocol.datagram_received(_packet(msgtypes.LightGetPower), ADDR)
+        protocol.datagram_received(
+            _packet(msgtypes.StateService, BROADCAST_MAC, service=1, port=56700), ADDR)
+        # Truncated packets whose size fields match their length
+        for packet in (
+                _packet(msgtypes.StateService, service=1, port=56700),
+                _packet(msgtypes.StatePower, power_level=65535)):
+            protocol.datagram_received(struct.pack("<H", 37) + packet[2:37], ADDR)
+        assert protocol.filtered == {"short": 1, "type": 2, "broadcast": 1, "payload": 2}
+        assert protocol.get_lights() == []
+    finally:
+        loop.close()
+
+
+def test_mac_addr() -> None:
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr="D0:73:D5:12:34:56", ip_addr=ADDR[0], port=ADDR[1])
+        other = Light(loop=loop, mac_addr=bytes(6), ip_addr=ADDR[0], port=ADDR[1])
+        assert light.mac == bytes.fromhex("d073d5123456")
+        assert light.mac_addr == MAC
+        lights = Lights(loop=loop, light_list=[light, other])
+        assert list(lights.get_by_mac_addr("D0:73:D5:12:34:56")) == [light]
+    finally:
+        loop.close()
+
+
+def test_lights_set_color_encodes_once() -> None:
+    """Fan-out commands send every light the same packet it would have built itself."""
+    loop = aio.new_event_loop()
+    try:
+        light_list = [
+            Light(loop=loop, mac_addr=bytes([0xd0, 0x73, 0xd5, 0, 0, i]), ip_addr=ADDR[0], port=ADDR[1])
+            for i in range(3)
+        ]
+        transports = [FakeTransport(light, loop=loop) for light in light_list]
+        lights = Lights(loop=loop, light_list=light_list)
+        payload = {"color": colors.RED.get_values(), "duration": 100}
+
+        loop.run_until_complete(lights.set_color(colors.RED, duration=100))
+        for light, transport in zip(light_list, transports):
+            expected = msgtypes.LightSetColor(
+                target_addr=light.mac, source_id=light._source_id, seq_num=1,
+                payload=payload, ack_requested=True)
+            assert transport.sent == [expected.generate_packed_message()]
+            assert light._color is colors.RED
+
+        loop.run_until_complete(lights.set_power(True, rapid=True))
+        loop.run_until_complete(aio.sleep(0.1, loop=loop))
+        for light, transport in zip(light_list, transports):
+            power = msgtypes.SetPower(
+                target_addr=light.mac, source_id=light._source_id, seq_num=0,
+                payload={"power_level": 65535})
+            assert transport.sent[1:] == [power.generate_packed_message()]
+            assert light._power_level is True
+    finally:
+        loop.close()
+
+
+def test_lights_share_one_socket() -> None:
+    """Every light sends from the same socket, and replies reach the right light."""
+    loop = aio.new_event_loop()
+    try:
+        bulb = FakeBulb()
+        transport, _ = loop.run_until_complete(loop.create_datagram_endpoint(
+            lambda: bulb, local_addr=("127.0.0.1", 0)))
+        ip_addr, port = transport.get_extra_info("sockname")
+        light_list = [
+            Light(loop=loop, mac_addr=bytes([0xd0, 0x73, 0xd5, 0, 0, i]), ip_addr=ip_addr, port=port)
+            for i in range(5)
+        ]
+        tasks = [loop.create_task(light._connect(socket.AF_INET)) for light in light_list]
+        for light, task in zip(light_list, tasks):
+            light._task = task
+        loop.run_until_complete(aio.gather(*tasks, loop=loop))
+        multiplexer = get_multiplexer(loop, socket.AF_INET)
+        assert len(multiplexer) == 5
+        assert all(light.is_alive() for light in light_list)
+
+        loop.run_until_complete(Lights(loop=loop, light_list=light_list).set_color(colors.RED))
+        assert len(bulb.senders) == 1
+        assert all(light._color is colors.RED for light in light_list)
+
+        # A reply for a light that isn't registered is dropped
+        multiplexer.datagram_received(_packet(msgtypes.Acknowledgement), ADDR)
+        assert multiplexer.unrouted == 1
+
+        light_list[0].cleanup()
+        assert len(multiplexer) == 4
+        assert multiplexer.get_extra_info("socket") is not None
+
+        # The socket is closed when the last light leaves
+        for light in light_list[1:]:
+            light.cleanup()
+        assert len(multiplexer) == 0
+        assert multiplexer.get_extra_info("socket") is None
+        assert get_multiplexer(loop, socket.AF_INET) is not multiplexer
+
+        # Closing the multiplexers of a loop cleans up their lights
+        loop.run_until_complete(light_list[0]._connect(socket.AF_INET))
+        assert light_list[0]._transport is not None
+        close_multiplexers(loop)
+        assert light_list[0]._transport is None
+        assert not any(key[0] is loop for key in _MULTIPLEXERS)
+        transport.close()
+        loop.run_until_complete(aio.sleep(0, loop=loop))
+    finally:
+        loop.close()
+
+
+def test_pending_table() -> None:
+    loop = aio.new_event_loop()
+    try:
+        table = PendingTable(loop=loop)
+        seq_nums = [table.reserve() for _ in range(SEQ_NUM_COUNT)]
+        assert sorted(seq_nums) == list(range(SEQ_NUM_COUNT))
+        assert seq_nums[:2] == [1, 2]
+        with pytest.raises(RuntimeError):
+            table.reserve()
+        # Numbers still waiting for a reply are skipped
+        table.release(5)
+        table.release(7)
+        assert table.reserve() == 5
+        assert table.reserve() == 7
+
+        future = table.expect(1, msgtypes.Acknowledgement)
+        with pytest.raises(RuntimeError):
+            table.expect(1, msgtypes.Acknowledgement)
+        assert not table.resolve(MessageView(_packet(msgtypes.StatePower, seq_num=1, power_level=0)))
+        assert table.resolve(MessageView(_packet(msgtypes.Acknowledgement, seq_num=1)))
+        assert future.result().seq_num == 1
+        # A duplicate reply, and a reply for a request that gave up
+        assert not table.resolve(MessageView(_packet(msgtypes.Acknowledgement, seq_num=1)))
+        table.release(1)
+        assert not table.resolve(MessageView(_packet(msgtypes.Acknowledgement, seq_num=1)))
+        assert table.stale == 3
+    finally:
+        loop.close()
+
+
+def test_pack_failures_release_sequence_numbers() -> None:
+    """A request that can't be packed doesn't keep its sequence number."""
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop)
+        lights = Lights(loop, [light])
+        for _ in range(SEQ_NUM_COUNT + 1):
+            with pytest.raises(struct.error):
+                loop.run_until_complete(light.set_infrared(150))
+            with pytest.raises(struct.error):
+                loop.run_until_complete(lights.set_color(colors.Color(400, 100, 100, 3500)))
+        assert len(light._pending) == 0
+        assert transport.sent == []
+        loop.run_until_complete(light.get_power())
+
+        # The second light has no sequence numbers left
+        full = Light(loop=loop, mac_addr=bytes(6), ip_addr=ADDR[0], port=ADDR[1])
+        for _ in range(SEQ_NUM_COUNT):
+            full._seq_next()
+        with pytest.raises(RuntimeError):
+            loop.run_until_complete(Lights(loop, [light, full]).set_power(True))
+        assert len(light._pending) == 0
+    finally:
+        loop.close()
+
+
+def test_rtt_estimator() -> None:
+    rtt = RttEstimator(initial_timeout=0.5, min_timeout=0.05, max_timeout=2.0)
+    assert rtt.timeout() == 0.5
+    assert rtt.timeout(1) == 1.0
+    rtt.update(0.1)
+    assert rtt.timeout() == pytest.approx(0.3)
+    assert rtt.timeout(1) == pytest.approx(0.6)
+    assert rtt.timeout(10) == 2.0
+    rtt.update(0.2)
+    assert rtt.srtt == pytest.approx(0.1125)
+    assert rtt.rttvar == pytest.approx(0.0625)
+    for _ in range(100):
+        rtt.update(0.001)
+    assert rtt.timeout() == 0.05
+    with pytest.raises(ValueError):
+        RttEstimator(min_timeout=1.0, max_timeout=0.5)
+
+
+def test_light_measures_rtt() -> None:
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        FakeTransport(light, loop=loop)
+        assert light.rtt.srtt is None
+        loop.run_until_complete(light.set_power(True))
+        assert light.rtt.srtt is not None
+        assert light.rtt.timeout() < 0.5
+    finally:
+        loop.close()
+
+
+def test_token_bucket() -> None:
+    loop = aio.new_event_loop()
+    try:
+        bucket = TokenBucket(loop=loop, rate=20, burst=3)
+        delays = [bucket.reserve() for _ in range(5)]
+        assert delays[:3] == [0, 0, 0]
+        assert delays[3:] == [pytest.approx(0.05, abs=0.01), pytest.approx(0.1, abs=0.01)]
+        with pytest.raises(ValueError):
+            TokenBucket(loop=loop, rate=0)
+    finally:
+        loop.close()
+
+
+def test_every_send_is_paced() -> None:
+    """Acked, response and rapid sends share the light's token bucket."""
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop)
+        light.pacer.rate = 50
+        light.pacer.burst = 2
+
+        async def send() -> None:
+            await light.set_power(True, rapid=True)
+            await light.set_power(False, rapid=True)
+            await light.set_color(colors.RED)
+            await light.set_power(True)
+        start = loop.time()
+        loop.run_until_complete(send())
+        loop.run_until_complete(aio.sleep(0, loop=loop))
+        assert len(transport.sent) == 4
+        assert loop.time() - start >= 0.035
+    finally:
+        loop.close()
+
+
+def test_commands_coalesce() -> None:
+    """Only the latest of the commands waiting for their turn is sent."""
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop)
+        light.commands.enabled = True
+        color_list = [colors.RED, colors.GREEN, colors.BLUE, colors.WHITE]
+
+        async def send() -> None:
+            await aio.gather(
+                *[light.set_color(color) for color in color_list],
+                light.set_power(True, rapid=True), loop=loop)
+        loop.run_until_complete(send())
+        sent = [unpack_lifx_message(packet) for packet in transport.sent]
+        assert [type(msg) for msg in sent] == [msgtypes.LightSetColor, msgtypes.SetPower]
+        assert sent[0].color == colors.WHITE.get_values()
+        assert light.commands.superseded == 3
+        assert light._color is colors.WHITE
+        assert light._power_level is True
+        assert len(light.commands) == 0
+    finally:
+        loop.close()
+
+
+def test_command_queue_coalesces_behind_running_command() -> None:
+    loop = aio.new_event_loop()
+    try:
+        sent = []  # type: List[Any]
+        release = aio.Event(loop=loop)
+
+        async def send(key: Hashable, value: Any) -> None:
+            sent.append(value)
+            await release.wait()
+
+        queue = CommandQueue(loop=loop, send=send)
+
+        async def submit() -> None:
+            first = loop.create_task(queue.submit("color", 1))
+            await aio.sleep(0, loop=loop)
+            await aio.sleep(0, loop=loop)
+            assert sent == [1]
+            rest = [loop.create_task(queue.submit("color", value)) for value in (2, 3, 4)]
+            await aio.sleep(0, loop=loop)
+            release.set()
+            await aio.gather(first, *rest, loop=loop)
+        loop.run_until_complete(submit())
+        assert sent == [1, 4]
+        assert queue.superseded == 2
+    finally:
+        loop.close()
+
+
+def test_command_queue_failure_with_no_callers() -> None:
+    """A command that fails after its callers were cancelled logs nothing."""
+    loop = aio.new_event_loop()
+    try:
+        errors = []  # type: List[Dict[str, Any]]
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+
+        async def send(key: Hashable, value: Any) -> None:
+            await aio.sleep(0, loop=loop)
+            raise LightOffline()
+
+        queue = CommandQueue(loop=loop, send=send)
+        caller = loop.create_task(queue.submit("color", 1))
+        loop.run_until_complete(aio.sleep(0, loop=loop))
+        caller.cancel()
+        loop.run_until_complete(aio.sleep(0.01, loop=loop))
+        del caller
+        gc.collect()
+        assert errors == []
+    finally:
+        loop.close()
+
+
+def test_in_flight_window() -> None:
+    loop = aio.new_event_loop()
+    try:
+        window = InFlightWindow(loop=loop, size=2)
+        order = []  # type: List[str]
+
+        async def request(name: str, barrier: bool=False) -> None:
+            await window.acquire(barrier=barrier)
+            order.append(name)
+            await aio.sleep(0.01, loop=loop)
+            window.release(barrier=barrier)
+
+        async def run() -> None:
+            tasks = [
+                loop.create_task(request("get1")),
+                loop.create_task(request("set", barrier=True)),
+                loop.create_task(request("get2")),
+                loop.create_task(request("get3")),
+            ]
+            await aio.sleep(0, loop=loop)
+            # The Set holds back the Gets sent after it
+            assert order == ["get1", "set"]
+            assert window.in_flight == 2
+            await aio.gather(*tasks, loop=loop)
+        loop.run_until_complete(run())
+        assert order == ["get1", "set", "get2", "get3"]
+        assert window.in_flight == 0
+    finally:
+        loop.close()
+
+
+def test_metadata_is_pipelined() -> None:
+    """get_metadata sends every request before the first reply comes back."""
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop, delay=0.1)
+        light.pacer.burst = 6
+        start = loop.time()
+        loop.run_until_complete(light.get_metadata(loop=loop))
+        assert loop.time() - start < 0.2
+        assert [type(unpack_lifx_message(packet)) for packet in transport.sent] == [
+            msgtypes.GetLabel, msgtypes.GetLocation, msgtypes.GetVersion, msgtypes.GetGroup,
+            msgtypes.GetWifiFirmware, msgtypes.GetHostFirmware]
+        assert light.label == "Kitchen"
+    finally:
+        loop.close()
+
+
+def test_set_color_confirm() -> None:
+    """A confirmed Set gets the ACK and the new state from one packet."""
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop)
+        state = loop.run_until_complete(light.set_color(colors.RED, confirm=True))
+        assert isinstance(state, msgtypes.LightState)
+        assert len(transport.sent) == 1
+        assert light.stale_replies == 0
+        # The reply is the state when the light got the message, not the new colour
+        assert state.color != colors.RED.get_values()
+        assert loop.run_until_complete(light.get_color()) is colors.RED
+        assert len(transport.sent) == 1
+        with pytest.raises(ValueError):
+            loop.run_until_complete(light.set_color(colors.RED, rapid=True, confirm=True))
+    finally:
+        loop.close()
+
+
+def test_circuit_breaker() -> None:
+    """An unreachable light fails at once until a probe gets an answer."""
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop)
+        light.rtt.initial_timeout = light.rtt.min_timeout = light.rtt.max_timeout = 0.01
+        light.breaker.probe_interval = 0.02
+        lights = Lights(loop, [light])
+        transport.drop = True
+        for failures in range(1, 4):
+            assert light.breaker.state == breaker.CLOSED
+            with pytest.raises(LightOffline):
+                loop.run_until_complete(light.set_power(True))
+            assert len(transport.sent) == 3 * failures
+        assert light.breaker.state == breaker.OPEN
+        assert list(lights.get_online()) == []
+
+        with pytest.raises(LightOffline):
+            loop.run_until_complete(light.set_power(True))
+        assert len(transport.sent) == 9
+        assert light.breaker.rejected == 1
+
+        # The first probe goes unanswered
+        loop.run_until_complete(aio.sleep(0.05, loop=loop))
+        assert len(transport.sent) == 10
+        assert light.breaker.state == breaker.OPEN
+
+        transport.drop = False
+        loop.run_until_complete(aio.sleep(0.05, loop=loop))
+        assert light.breaker.state == breaker.CLOSED
+        assert light.online
+        assert list(lights.get_online()) == [light]
+        loop.run_until_complete(light.set_power(False))
+        assert len(transport.sent) == 12
+    finally:
+        loop.close()
+
+
+def test_circuit_breaker_gives_up() -> None:
+    """A light that stays away is cleaned up and dropped by discovery."""
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop)
+        light._task = loop.create_task(aio.sleep(3600, loop=loop))
+        light.rtt.initial_timeout = light.rtt.min_timeout = light.rtt.max_timeout = 0.01
+        light.breaker.failure_threshold = 1
+        light.breaker.probe_interval = light.breaker.max_probe_interval = 0.01
+        light.breaker.give_up_after = 0.05
+        protocol = LifxDiscoveryProtocol(loop=loop)
+        protocol._transport = transport  # type: ignore
+        protocol._seen[light.mac] = light
+        transport.drop = True
+        with pytest.raises(LightOffline):
+            loop.run_until_complete(light.set_power(True))
+        loop.run_until_complete(aio.sleep(0.2, loop=loop))
+        assert light.breaker.state == breaker.OPEN
+        assert not light.is_alive()
+
+        # No more probes are sent
+        sent = len(transport.sent)
+        loop.run_until_complete(aio.sleep(0.05, loop=loop))
+        assert len(transport.sent) == sent
+
+        protocol._discover()
+        assert protocol.get_lights() == []
+    finally:
+        loop.close()
+
+
+def test_identical_gets_share_a_request() -> None:
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop, delay=0.01)
+
+        async def read() -> Any:
+            return await aio.gather(
+                light.get_color(), light.get_color(), light.get_color(), light.get_power(),
+                loop=loop)
+        results = loop.run_until_complete(read())
+        assert [type(unpack_lifx_message(packet)) for packet in transport.sent] == [
+            msgtypes.LightGet, msgtypes.GetPower]
+        assert str(results[0]) == str(results[1]) == str(results[2])
+        assert light.shared_replies == 2
+        assert len(light._pending) == 0
+
+        # Only requests in flight at the same time are shared
+        loop.run_until_complete(light.get_color(max_age=0))
+        assert len(transport.sent) == 3
+    finally:
+        loop.close()
+
+
+def test_state_cache() -> None:
+    """Reads are served from the cache until it is stale, and see acknowledged writes."""
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop)
+
+        def sent() -> List[Type[Message]]:
+            return [type(unpack_lifx_message(packet)) for packet in transport.sent]
+
+        loop.run_until_complete(light.get_power())
+        loop.run_until_complete(light.get_power())
+        assert sent() == [msgtypes.GetPower]
+        assert light.cache.hits == 1
+        loop.run_until_complete(light.get_power(max_age=0))
+        assert sent() == [msgtypes.GetPower] * 2
+
+        loop.run_until_complete(light.set_color(colors.RED))
+        assert loop.run_until_complete(light.get_color()) is colors.RED
+        assert sent()[-1] is msgtypes.LightSetColor
+
+        # A rapid Set may have been lost
+        loop.run_until_complete(light.set_color(colors.BLUE, rapid=True))
+        loop.run_until_complete(light.get_color())
+        assert sent()[-2:] == [msgtypes.LightSetColor, msgtypes.LightGet]
+
+        light.cache.ttls[cache.POWER] = 0.01
+        loop.run_until_complete(aio.sleep(0.02, loop=loop))
+        loop.run_until_complete(light.get_power())
+        assert sent()[-1] is msgtypes.GetPower
+        assert len(transport.sent) == 6
+    finally:
+        loop.close()
+
+
+def test_state_cache_reads_own_writes() -> None:
+    """After an acknowledged Set, reads return the value set, as the getter reports it."""
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        transport = FakeTransport(light, loop=loop)
+        lights = Lights(loop, [light])
+
+        loop.run_until_complete(light.set_power(True))
+        assert loop.run_until_complete(light.get_power()) is True
+        loop.run_until_complete(light.set_light_power(False, duration=100))
+        assert loop.run_until_complete(light.get_light_power()) is False
+        loop.run_until_complete(lights.set_power(1))
+        assert loop.run_until_complete(light.get_power()) is True
+        loop.run_until_complete(lights.set_light_power(0))
+        assert loop.run_until_complete(light.get_light_power()) is False
+        loop.run_until_complete(light.set_infrared(50))
+        assert loop.run_until_complete(light.get_infrared()) == 50
+        loop.run_until_complete(light.set_color(colors.GREEN))
+        assert loop.run_until_complete(light.get_color()) is colors.GREEN
+        loop.run_until_complete(lights.set_color(colors.BLUE))
+        assert loop.run_until_complete(light.get_color()) is colors.BLUE
+
+        # Only Set messages were sent
+        assert len(transport.sent) == 7
+        assert light.cache.misses == 0
+    finally:
+        loop.close()
+
+
+def test_discovery_tracks_volunteered_state() -> None:
+    """State messages a light sends by itself update its cached state."""
+    loop = aio.new_event_loop()
+    try:
+        protocol = LifxDiscoveryProtocol(loop=loop)
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        protocol._seen[light.mac] = light
+        protocol.datagram_received(_packet(msgtypes.StatePower, power_level=65535), ADDR)
+        protocol.datagram_received(_packet(msgtypes.StateLabel, label=b"Porch"), ADDR)
+        # Not a light we know
+        protocol.datagram_received(
+            _packet(msgtypes.StatePower, "d0:73:d5:00:00:01", power_level=0), ADDR)
+        assert protocol.filtered == {}
+        assert protocol.get_lights() == [light]
+        assert light.observed_states == 2
+        assert light.label == "Porch"
+        assert light.cache.updated_at(cache.LABEL) is not None
+        # Answered from the cache, there is no transport
+        assert loop.run_until_complete(light.get_power()) is True
+        assert light.cache.hits == 1
+    finally:
+        loop.close()
+
+
+def test_discovery_drops_truncated_state() -> None:
+    """Volunteered State messages too short for their type never reach the light."""
+    loop = aio.new_event_loop()
+    try:
+        protocol = LifxDiscoveryProtocol(loop=loop)
+        light = Light(loop=loop, mac_addr=MAC, ip_addr=ADDR[0], port=ADDR[1])
+        protocol._seen[light.mac] = light
+        packets = [
+            _packet(msgtypes.StatePower, power_level=65535),
+            _packet(msgtypes.LightStatePower, power_level=65535),
+            _packet(msgtypes.StateLabel, label=b"Porch"),
+            _packet(msgtypes.LightState, color=(0, 0, 0, 3500), power_level=0, label=b"Porch"),
+        ]
+        for packet in packets:
+            size = len(packet) - 1
+            protocol.datagram_received(struct.pack("<H", size) + packet[2:size], ADDR)
+        assert protocol.filtered == {"payload": 4}
+        assert light.observed_states == 0
+        assert protocol.get_lights() == [light]
+    finally:
+        loop.close()
+
+
+def test_discovery_observes_volunteered_light_state() -> None:
+    """A LightState sent by a light that just booted registers it with its state."""
+    loop = aio.new_event_loop()
+    try:
+        protocol = LifxDiscoveryProtocol(loop=loop)
+        protocol.datagram_received(_packet(
+            msgtypes.LightState, color=(0, 65535, 65535, 3500), power_level=65535,
+            label=b"Porch \xff"), ADDR)
+        light, = protocol.get_lights()
+        assert light.observed_states == 1
+        # Labels that aren't valid UTF-8 are kept rather than dropped
+        assert light.label == "Porch \ufffd"
+        assert light.cache.updated_at(cache.COLOR) is not None
+        assert loop.run_until_complete(light.get_power()) is True
+        assert loop.run_until_complete(light.get_color()).get_values() == (0, 65535, 65535, 3500)
+        assert light.cache.hits == 2
+
+        # renew attached the light to the shared socket
+        assert light._task is not None
+        loop.run_until_complete(light._task)
+        assert light.is_alive()
+        close_multiplexers(loop)
+        assert not light.is_alive()
+        loop.run_until_complete(aio.sleep(0, loop=loop))
+    finally:
+        loop.close()
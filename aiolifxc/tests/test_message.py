@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the `aiolifxc` wire encoder and decoder."""
+import struct
+import tracemalloc
+from typing import Any, Callable, Dict, Type
+
+import pytest
+
+from aiolifxc import msgtypes
+from aiolifxc.message import (BROADCAST_MAC, HeaderTemplate, Message,
+                              convert_bytes_to_MAC, convert_MAC_to_bytes,
+                              pack_bulk)
+from aiolifxc.schema import _to_bytes
+from aiolifxc.unpack import unpack_lifx_message
+from aiolifxc.view import MessageView
+
+from . import legacy
+
+COLOR = (21845, 65535, 32768, 3500)
+
+PAYLOADS = {
+    msgtypes.StateService: {"service": 1, "port": 56700},
+    msgtypes.StateHostInfo: {"signal": 1.5e-06, "tx": 1234, "rx": 5678, "reserved1": -2},
+    msgtypes.StateHostFirmware: {"build": 1502237570000000000, "reserved1": 0, "version": 131094},
+    msgtypes.StateWifiInfo: {"signal": 3.2e-05, "tx": 0, "rx": 4294967295, "reserved1": 0},
+    msgtypes.StateWifiFirmware: {"build": 1456093684000000000, "reserved1": 0, "version": 6619136},
+    msgtypes.SetPower: {"power_level": 65535},
+    msgtypes.StatePower: {"power_level": 0},
+    msgtypes.SetLabel: {"label": "Kitchen"},
+    msgtypes.StateLabel: {"label": b"Kitchen"},
+    msgtypes.StateVersion: {"vendor": 1, "product": 22, "version": 0},
+    msgtypes.StateInfo: {"time": 1508000000000000000, "uptime": 3600000000000, "downtime": 5000000000},
+    msgtypes.StateLocation: {"location": list(range(16)), "label": b"Home", "updated_at": 1508000000000000000},
+    msgtypes.StateGroup: {"group": list(range(16, 32)), "label": b"Lounge", "updated_at": 1},
+    msgtypes.EchoRequest: {"byte_array": [1, 2, 3, 4]},
+    msgtypes.EchoResponse: {"byte_array": [1, 2, 3, 4]},
+    msgtypes.LightSetColor: {"color": COLOR, "duration": 1000},
+    msgtypes.LightSetWaveform: {
+        "transient": 1, "color": COLOR, "period": 100, "cycles": 30.0, "duty_cycle": -100, "waveform": 4},
+    msgtypes.LightState: {
+        "color": COLOR, "reserved1": 0, "power_level": 65535, "label": b"Kitchen", "reserved2": 0},
+    msgtypes.LightSetPower: {"power_level": 65535, "duration": 500},
+    msgtypes.LightStatePower: {"power_level": 65535},
+    msgtypes.LightStateInfrared: {"infrared_brightness": 32767},
+    msgtypes.LightSetInfrared: {"infrared_brightness": 65535},
+    msgtypes.MultiZoneStateZone: {"count": 16, "index": 3, "color": COLOR},
+    msgtypes.MultiZoneStateMultiZone: {"count": 16, "index": 8, "color": [COLOR] * 8},
+    msgtypes.MultiZoneSetColorZones: {
+        "start_index": 0, "end_index": 7, "color": COLOR, "duration": 0, "apply": 1},
+    msgtypes.MultiZoneGetColorZones: {"start_index": 0, "end_index": 255},
+}  # type: Dict[Type[Message], Dict[str, Any]]
+
+
+def _create(msg_type: Type[Message], **kwargs: Any) -> Message:
+    options = {
+        "target_addr": "d0:73:d5:12:34:56",
+        "source_id": 0x12345678,
+        "seq_num": 42,
+        "payload": PAYLOADS.get(msg_type, {}),
+    }  # type: Dict[str, Any]
+    options.update(kwargs)
+    return msg_type(**options)
+
+
+def test_matches_legacy_encoder() -> None:
+    """Every message type encodes to exactly the bytes bitstring produced."""
+    for msg_type in msgtypes.MSG_IDS:
+        expected = legacy.generate_packed_message(_create(msg_type))
+        assert _create(msg_type).generate_packed_message() == expected, msg_type.__name__
+
+
+def test_header_flags_match_legacy_encoder() -> None:
+    for ack_requested in (False, True):
+        for response_requested in (False, True):
+            msg = _create(
+                msgtypes.GetService, target_addr=BROADCAST_MAC, source_id=0, seq_num=255,
+                ack_requested=ack_requested, response_requested=response_requested)
+            packed = msg.generate_packed_message()
+            assert len(packed) == 36
+            assert packed == legacy.generate_packed_message(msg)
+
+
+def test_header_template_matches_encoder() -> None:
+    """A patched template gives the same packet as encoding from scratch."""
+    for msg_type in msgtypes.MSG_IDS:
+        for target_addr in (BROADCAST_MAC, "d0:73:d5:12:34:56"):
+            template = HeaderTemplate(msg_type, target_addr=target_addr, source_id=0x12345678)
+            for seq_num, ack_requested, response_requested in ((1, True, False), (200, False, True)):
+                msg = _create(
+                    msg_type, target_addr=target_addr, seq_num=seq_num,
+                    ack_requested=ack_requested, response_requested=response_requested)
+                expected = _create(
+                    msg_type, target_addr=target_addr, seq_num=seq_num,
+                    ack_requested=ack_requested,
+                    response_requested=response_requested).generate_packed_message()
+                assert template.pack_message(msg) == expected, msg_type.__name__
+
+
+def test_pack_bulk_matches_encoder() -> None:
+    targets = [bytes([0xd0, 0x73, 0xd5, 0, 0, i]) for i in range(5)] + [bytes(6)]
+    addresses = [(target, 1000 + i, i) for i, target in enumerate(targets)]
+    for msg_type in (msgtypes.GetService, msgtypes.LightSetColor, msgtypes.LightSetWaveform):
+        packets = pack_bulk(msg_type, PAYLOADS.get(msg_type, {}), addresses, ack_requested=True)
+        assert len(packets) == len(addresses)
+        for packet, (target, source_id, seq_num) in zip(packets, addresses):
+            expected = _create(
+                msg_type, target_addr=target, source_id=source_id, seq_num=seq_num,
+                ack_requested=True).generate_packed_message()
+            assert packet == expected, msg_type.__name__
+    assert pack_bulk(msgtypes.GetService, {}, []) == []
+
+
+def test_schema_round_trip() -> None:
+    """Decoding an encoded message gives back the same header and payload."""
+    for msg_type in msgtypes.MSG_IDS:
+        msg = _create(msg_type, ack_requested=True)
+        decoded = unpack_lifx_message(msg.generate_packed_message())
+        assert type(decoded) is msg_type
+        assert decoded.target_addr == msg.target_addr
+        assert decoded.source_id == msg.source_id
+        assert decoded.seq_num == msg.seq_num
+        assert decoded.ack_requested
+        assert not decoded.response_requested
+        for field in msg_type.schema.fields:
+            expected = getattr(msg, field.name)
+            if field.wire_type == "bytes":
+                expected = _to_bytes(expected).ljust(field.count or 0, b"\0")
+            elif field.wire_type == "float32":
+                expected = pytest.approx(expected)
+            assert getattr(decoded, field.name) == expected, (msg_type.__name__, field.name)
+
+
+def test_mac_address_conversion() -> None:
+    target = bytes.fromhex("d073d5123456")
+    assert convert_MAC_to_bytes("D0:73:D5:12:34:56") == target
+    assert convert_MAC_to_bytes(target) is target
+    assert convert_bytes_to_MAC(target) == "d0:73:d5:12:34:56"
+    msg = _create(msgtypes.GetService, target_addr=target)
+    assert msg.target is target
+    assert msg.target_addr == "d0:73:d5:12:34:56"
+    assert msg.generate_packed_message() == _create(msgtypes.GetService).generate_packed_message()
+    assert _create(msgtypes.GetService, target_addr=BROADCAST_MAC).tagged == 1
+
+
+def test_unknown_message_type() -> None:
+    packet = bytearray(_create(msgtypes.GetService).generate_packed_message())
+    struct.pack_into("<H", packet, 32, 9999)
+    decoded = unpack_lifx_message(bytes(packet))
+    assert isinstance(decoded, Message)
+    assert type(decoded) not in msgtypes.MSG_IDS
+    assert decoded.message_type == 9999
+    assert decoded.generate_packed_message() == packet
+    assert msgtypes.GetService.message_type == 2
+
+
+def test_message_is_encoded_once() -> None:
+    msg = _create(msgtypes.LightSetColor)
+    packed = msg.generate_packed_message()
+    assert msg.generate_packed_message() is packed
+    str(msg)
+    assert msg.generate_packed_message() is packed
+    assert msg.header + msg.payload == packed
+    assert msg.payload_fields == [("Reserved", 0), ("Color (HSBK)", COLOR), ("Duration (ms)", 1000)]
+    with pytest.raises(AttributeError):
+        msg.seq_num = 43
+    with pytest.raises(AttributeError):
+        msg.duration = 0
+
+
+def test_message_view_matches_decoder() -> None:
+    """A view reports the same fields as a fully decoded message."""
+    for msg_type in msgtypes.MSG_IDS:
+        packet = _create(msg_type, response_requested=True).generate_packed_message()
+        view = MessageView(packet)
+        decoded = unpack_lifx_message(packet)
+        assert len(view) == len(packet)
+        for name in (
+                "size", "origin", "tagged", "addressable", "protocol", "source_id", "target_addr",
+                "ack_requested", "response_requested", "seq_num", "message_type"):
+            assert getattr(view, name) == getattr(decoded, name), (msg_type.__name__, name)
+        assert view.msg_type is msg_type
+        assert type(view.decode()) is msg_type
+        for field in msg_type.schema.fields:
+            assert getattr(view, field.name) == getattr(decoded, field.name)
+
+
+def test_message_view_payload_is_lazy() -> None:
+    view = MessageView(_create(msgtypes.LightState).generate_packed_message())
+    assert view.seq_num == 42
+    assert view._payload is None
+    assert view.power_level == 65535
+    assert view._payload is not None
+    with pytest.raises(AttributeError):
+        view.no_such_field
+
+
+def _bytes_per_message(create: Callable[[], Message], count: int=1000) -> float:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        messages = [create() for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(messages) == count
+    return (after - before) / count
+
+
+def test_message_memory_budget() -> None:
+    """Messages are compact __slots__ objects without a __dict__."""
+    for msg_type in msgtypes.MSG_IDS:
+        assert not hasattr(_create(msg_type), "__dict__"), msg_type.__name__
+    target = bytes.fromhex("d073d5123456")
+    assert _bytes_per_message(lambda: _create(msgtypes.LightSetColor, target_addr=target)) <= 200
+    packet = _create(msgtypes.LightState).generate_packed_message()
+    # Includes the decoded colour tuple, label and MAC address
+    assert _bytes_per_message(lambda: unpack_lifx_message(packet)) <= 600
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the optional NumPy multizone codec."""
+import pytest
+
+from aiolifxc import msgtypes
+from aiolifxc.message import Message
+from aiolifxc.unpack import unpack_lifx_message
+from aiolifxc.view import MessageView
+
+numpy = pytest.importorskip("numpy")
+zones = pytest.importorskip("aiolifxc.zones")
+
+COLORS = [(i * 1000, 65535 - i, 32768 + i, 2500 + i * 100) for i in range(8)]
+
+
+def _state(color: object) -> Message:
+    return msgtypes.MultiZoneStateMultiZone(
+        target_addr="d0:73:d5:12:34:56", source_id=1, seq_num=2,
+        payload={"count": 16, "index": 8, "color": color})
+
+
+def test_view_colors() -> None:
+    packet = _state(COLORS).generate_packed_message()
+    colors = zones.view_colors(MessageView(packet))
+    assert colors.shape == (8, 4)
+    assert colors.dtype == numpy.uint16
+    assert colors.tolist() == [list(color) for color in COLORS]
+    assert [tuple(color) for color in colors] == unpack_lifx_message(packet).color
+
+
+def test_encode_from_array() -> None:
+    array = numpy.array(COLORS, dtype=numpy.uint16)
+    assert _state(array).generate_packed_message() == _state(COLORS).generate_packed_message()
+    packed = b"".join(value.to_bytes(2, "little") for color in COLORS for value in color)
+    assert zones.unpack_colors(packed, 0, 8).tolist() == array.tolist()
+
+
+def test_errors() -> None:
+    packet = _state(COLORS).generate_packed_message()
+    with pytest.raises(ValueError):
+        zones.view_colors(MessageView(packet), "count")
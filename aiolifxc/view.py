@@ -0,0 +1,155 @@
+""" Lazy read-only views over received LIFX packets. """
+import struct
+from typing import AbstractSet, Any, Dict, Optional, Type  # NOQA
+
+from . import msgtypes
+from .message import HEADER_SIZE_BYTES, Message, convert_bytes_to_MAC
+from .unpack import unpack_lifx_message
+
+_UINT16 = struct.Struct("<H")
+_UINT32 = struct.Struct("<I")
+# size, flags and message type
+_PREFILTER = struct.Struct("<HH28xH")
+
+PROTOCOL = 1024
+
+# Reasons returned by prefilter()
+FILTER_SHORT = "short"
+FILTER_SIZE = "size"
+FILTER_PROTOCOL = "protocol"
+FILTER_TYPE = "type"
+FILTER_PAYLOAD = "payload"
+
+
+def prefilter(data: bytes, message_types: AbstractSet[int]) -> Optional[str]:
+    """
+    Check the fixed header bytes of a datagram before decoding anything.
+
+    :param data: The received datagram.
+    :param message_types: The message type ids the caller is interested in.
+    :return: None if the packet should be processed, else the reason to drop it.
+    """
+    if len(data) < HEADER_SIZE_BYTES:
+        return FILTER_SHORT
+    size, flags, message_type = _PREFILTER.unpack_from(data)
+    if size != len(data):
+        return FILTER_SIZE
+    if flags & 4095 != PROTOCOL or not flags & 0x1000:
+        return FILTER_PROTOCOL
+    if message_type not in message_types:
+        return FILTER_TYPE
+    msg_type = msgtypes.MSG_TYPES.get(message_type)
+    if msg_type is not None and len(data) - HEADER_SIZE_BYTES < msg_type.schema.size:
+        return FILTER_PAYLOAD
+    return None
+
+
+class MessageView(object):
+    """
+    A view of a received datagram that decodes fields on demand.
+
+    Header fields are read straight from the buffer with ``struct.unpack_from``,
+    so routing code can check ``source_id``, ``seq_num`` and ``message_type``
+    without decoding the packet. The payload is decoded the first time a
+    payload field is accessed. Use ``decode()`` to get a full `Message`.
+
+    The datagram must be at least ``HEADER_SIZE_BYTES`` long; check ``len()``
+    before reading any field.
+    """
+    __slots__ = ("_buffer", "_payload")
+
+    def __init__(self, data: bytes) -> None:
+        self._buffer = memoryview(data)
+        self._payload = None  # type: Optional[Dict[str, Any]]
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def buffer(self) -> memoryview:
+        """ The whole datagram. """
+        return self._buffer
+
+    @property
+    def size(self) -> int:
+        return _UINT16.unpack_from(self._buffer, 0)[0]  # type: ignore
+
+    @property
+    def flags(self) -> int:
+        return _UINT16.unpack_from(self._buffer, 2)[0]  # type: ignore
+
+    @property
+    def origin(self) -> int:
+        return (self._buffer[3] >> 6) & 3
+
+    @property
+    def tagged(self) -> int:
+        return (self._buffer[3] >> 5) & 1
+
+    @property
+    def addressable(self) -> int:
+        return (self._buffer[3] >> 4) & 1
+
+    @property
+    def protocol(self) -> int:
+        return self.flags & 4095
+
+    @property
+    def source_id(self) -> int:
+        return _UINT32.unpack_from(self._buffer, 4)[0]  # type: ignore
+
+    @property
+    def target(self) -> bytes:
+        """ The 6 byte target MAC address. """
+        return self._buffer[8:14].tobytes()
+
+    @property
+    def target_addr(self) -> str:
+        """ The target MAC address, formatted as a string. """
+        return convert_bytes_to_MAC(self.target)
+
+    @property
+    def ack_requested(self) -> bool:
+        return bool(self._buffer[22] & 2)
+
+    @property
+    def response_requested(self) -> bool:
+        return bool(self._buffer[22] & 1)
+
+    @property
+    def seq_num(self) -> int:
+        return self._buffer[23]
+
+    @property
+    def message_type(self) -> int:
+        return _UINT16.unpack_from(self._buffer, 32)[0]  # type: ignore
+
+    @property
+    def msg_type(self) -> Optional[Type[Message]]:
+        """ The registered message class, or None for unknown types. """
+        return msgtypes.MSG_TYPES.get(self.message_type)
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        """ The decoded payload fields, decoded once on first access. """
+        if self._payload is None:
+            msg_type = self.msg_type
+            if msg_type is None:
+                self._payload = {}
+            else:
+                self._payload = msg_type.schema.unpack(self._buffer, HEADER_SIZE_BYTES)
+        return self._payload
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.payload[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def decode(self) -> Message:
+        """ Fully decode the datagram into a `Message`. """
+        return unpack_lifx_message(self._buffer.tobytes())
+
+    def __repr__(self) -> str:
+        return "<{} type={} seq={} source={}>".format(
+            type(self).__name__, self.message_type, self.seq_num, self.source_id)
@@ -0,0 +1,65 @@
+""" Optional NumPy codec for multizone colours.
+
+Multizone lights report their zones as runs of HSBK colours. Decoding each
+run into a list of tuples and then into `Color` objects is too slow for
+strips that are updated at video rates, so this module reads them straight
+into ``(count, 4)`` arrays of uint16 instead. The columns are hue,
+saturation, brightness and kelvin, scaled as on the wire. Such an array can
+also be given as the colour field of a message to encode it.
+
+NumPy is an optional dependency; install it to use this module.
+"""
+from typing import TYPE_CHECKING, Any, Union  # NOQA
+
+from .message import HEADER_SIZE_BYTES
+from .view import MessageView
+
+try:
+    import numpy as _numpy
+    numpy = _numpy  # type: Any
+except ImportError:  # pragma: no cover
+    numpy = None
+
+if TYPE_CHECKING:
+    # A (count, 4) array of uint16 colours
+    ColorArray = Any
+
+# Little endian uint16, as on the wire
+HSBK_DTYPE = "<u2"
+
+
+def _require_numpy() -> None:
+    if numpy is None:
+        raise RuntimeError("NumPy is required for multizone colour arrays")
+
+
+def unpack_colors(data: Union[bytes, memoryview], offset: int, count: int) -> 'ColorArray':
+    """
+    Decode a run of HSBK colours without copying them.
+
+    :param data: The buffer holding the colours.
+    :param offset: The byte offset of the first colour.
+    :param count: The number of colours.
+    :return: A read-only (count, 4) uint16 array backed by `data`.
+    """
+    _require_numpy()
+    return numpy.frombuffer(data, dtype=HSBK_DTYPE, count=count * 4, offset=offset).reshape(count, 4)
+
+
+def view_colors(view: MessageView, name: str="color") -> 'ColorArray':
+    """
+    Decode the colours of a received message straight from the datagram.
+
+    :param view: The received message, e.g. a `MultiZoneStateMultiZone`.
+    :param name: The name of the HSBK field.
+    :return: A read-only (count, 4) uint16 array.
+    """
+    msg_type = view.msg_type
+    if msg_type is None:
+        raise ValueError("Unknown message type {}".format(view.message_type))
+    schema = msg_type.schema
+    field = schema.fields[schema.names.index(name)]
+    if field.wire_type != "hsbk":
+        raise ValueError("{} is not a colour field of {}".format(name, msg_type.__name__))
+    offset = HEADER_SIZE_BYTES + schema.offsets[name]
+    return unpack_colors(view.buffer, offset, field.count or 0)
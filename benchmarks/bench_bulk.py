@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+""" Compare encoding a fan-out set_color per light and with the bulk encoder.
+
+Run from the top of the source tree::
+
+    python benchmarks/bench_bulk.py
+"""
+import os
+import sys
+from typing import List, Tuple  # NOQA
+
+# Find aiolifxc and the shared helpers when run as a script
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCHMARKS, os.path.dirname(BENCHMARKS)]
+
+from aiolifxc import msgtypes  # NOQA: E402
+from aiolifxc.message import HeaderTemplate, pack_bulk  # NOQA: E402
+from samples import rate  # NOQA: E402
+
+NUMBER = 200
+
+PAYLOAD = {"color": (21845, 65535, 32768, 3500), "duration": 0}
+
+
+def main() -> None:
+    print("{:>6} {:>16} {:>16} {:>8}".format("lights", "per light pkt/s", "bulk pkt/s", "speedup"))
+    for count in (10, 100, 500):
+        addresses = [
+            (i.to_bytes(6, "big"), 0x12345678 + i, i % 256) for i in range(1, count + 1)
+        ]  # type: List[Tuple[bytes, int, int]]
+        templates = [
+            HeaderTemplate(msgtypes.LightSetColor, target_addr=target, source_id=source_id)
+            for target, source_id, _ in addresses
+        ]
+
+        def per_light() -> List[bytes]:
+            return [
+                template.pack_message(msgtypes.LightSetColor(
+                    target_addr=target, source_id=source_id, seq_num=seq_num,
+                    payload=PAYLOAD, ack_requested=True))
+                for template, (target, source_id, seq_num) in zip(templates, addresses)
+            ]
+
+        def bulk() -> List[memoryview]:
+            return pack_bulk(msgtypes.LightSetColor, PAYLOAD, addresses, ack_requested=True)
+
+        assert per_light() == bulk()
+        before = rate(per_light, NUMBER)
+        after = rate(bulk, NUMBER)
+        print("{:>6} {:>16.0f} {:>16.0f} {:>7.1f}x".format(count, before * count, after * count, after / before))
+
+
+if __name__ == "__main__":
+    main()
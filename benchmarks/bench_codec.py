@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+""" Codec throughput for every registered message type, written as JSON.
+
+For each class in ``msgtypes.MSG_IDS`` this measures construct-and-pack,
+``unpack_lifx_message`` and ``MessageView`` rates, plus the bytes allocated
+and kept alive by each packed and decoded message. It also times the full request loop of
+``Light.get_color``: encode, send, decode the reply and match it.
+
+Run from the top of the source tree::
+
+    python benchmarks/bench_codec.py --output before.json
+    python benchmarks/bench_codec.py --output after.json --compare before.json
+"""
+import argparse
+import asyncio as aio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional  # NOQA
+
+# Find aiolifxc and the shared helpers when run as a script
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCHMARKS, os.path.dirname(BENCHMARKS)]
+
+from aiolifxc import msgtypes  # NOQA: E402
+from aiolifxc.aiolifx import Light  # NOQA: E402
+from aiolifxc.message import Message  # NOQA: E402
+from aiolifxc.unpack import unpack_lifx_message  # NOQA: E402
+from aiolifxc.view import MessageView  # NOQA: E402
+from samples import PAYLOADS, create, rate  # NOQA: E402
+
+REPEAT = 3
+ALLOCATIONS = 1000
+ADDR = ("192.0.2.1", 56700)
+
+
+def _retained_bytes(fun: Callable[[], Any]) -> float:
+    """ Return the bytes kept alive by each result of `fun`, including its packet. """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        results = [fun() for _ in range(ALLOCATIONS)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del results
+    return (after - before) / ALLOCATIONS
+
+
+def _view(packet: bytes) -> Any:
+    """ Route a packet the way Light.datagram_received does, then read the payload. """
+    view = MessageView(packet)
+    return view.seq_num, view.message_type, view.source_id, view.payload
+
+
+def bench_messages(number: int) -> Dict[str, Dict[str, Any]]:
+    results = {}  # type: Dict[str, Dict[str, Any]]
+    for msg_type, msg_id in sorted(msgtypes.MSG_IDS.items(), key=lambda item: item[1]):
+        packet = create(msg_type).generate_packed_message()
+        assert type(unpack_lifx_message(packet)) is msg_type
+
+        def pack() -> bytes:
+            return create(msg_type).generate_packed_message()
+
+        def packed_message() -> Message:
+            msg = create(msg_type)
+            msg.generate_packed_message()
+            return msg
+
+        results[msg_type.__name__] = {
+            "id": msg_id,
+            "size": len(packet),
+            "pack_per_sec": rate(pack, number),
+            "unpack_per_sec": rate(lambda: unpack_lifx_message(packet), number),
+            "view_per_sec": rate(lambda: _view(packet), number),
+            "pack_bytes": _retained_bytes(packed_message),
+            "unpack_bytes": _retained_bytes(lambda: unpack_lifx_message(packet)),
+        }
+    return results
+
+
+class _EchoTransport(object):
+    """ A transport that answers every request like a light would, without a network. """
+
+    def __init__(self, light: Light) -> None:
+        self._light = light
+
+    def sendto(self, data: bytes, addr: Any=None) -> None:
+        request = MessageView(data)
+        reply = msgtypes.LightState(
+            target_addr=request.target, source_id=request.source_id, seq_num=request.seq_num,
+            payload=PAYLOADS[msgtypes.LightState])
+        self._light.datagram_received(reply.generate_packed_message(), ADDR)
+
+    def close(self) -> None:
+        pass
+
+
+def bench_request_loop(number: int) -> Dict[str, Any]:
+    loop = aio.new_event_loop()
+    try:
+        light = Light(loop=loop, mac_addr="d0:73:d5:12:34:56", ip_addr=ADDR[0], port=ADDR[1])
+        light.connection_made(_EchoTransport(light))  # type: ignore
+        # Measure the request path, not the per-light send rate limit
+        light.pacer.rate = light.pacer.burst = 1e9
+
+        async def requests() -> None:
+            for _ in range(number):
+                await light.get_color(max_age=0)
+
+        best = min(
+            timeit.repeat(lambda: loop.run_until_complete(requests()), number=1, repeat=REPEAT))
+    finally:
+        loop.close()
+    return {"requests": "get_color", "requests_per_sec": number / best}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        output = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return str(output.decode().strip())
+
+
+def run(number: int) -> Dict[str, Any]:
+    return {
+        "meta": {
+            "date": datetime.datetime.utcnow().isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "number": number,
+        },
+        "messages": bench_messages(number),
+        "request_loop": bench_request_loop(max(number // 10, 1)),
+    }
+
+
+def print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    """ Print a summary, with the change from `baseline` if given. """
+    def change(name: str, key: str, value: float) -> str:
+        if baseline is None or name not in baseline["messages"]:
+            return ""
+        return " ({:+.0%})".format(value / baseline["messages"][name][key] - 1)
+
+    print("{:<26} {:>20} {:>20} {:>20}".format("message", "pack/s", "unpack/s", "view/s"))
+    for name, result in results["messages"].items():
+        print("{:<26} {:>20} {:>20} {:>20}".format(name, *[
+            "{:.0f}{}".format(result[key], change(name, key, result[key]))
+            for key in ("pack_per_sec", "unpack_per_sec", "view_per_sec")
+        ]))
+    requests_per_sec = results["request_loop"]["requests_per_sec"]
+    line = "request loop: {:.0f} get_color/s".format(requests_per_sec)
+    if baseline is not None:
+        line += " ({:+.0%})".format(requests_per_sec / baseline["request_loop"]["requests_per_sec"] - 1)
+    print(line)
+
+
+def main(argv: Optional[List[str]]=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=5000, help="operations per timing run")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="show the change from this earlier JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.number)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as compare_file:
+            baseline = json.load(compare_file)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
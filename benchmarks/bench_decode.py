@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+""" Measure unpack_lifx_message decodes/sec for every registered message type.
+
+The dispatch table should make the cost depend only on the payload, not on
+where the type sits in ``MSG_IDS``. Run from the top of the source tree::
+
+    python benchmarks/bench_decode.py
+"""
+import os
+import sys
+import timeit
+
+# Find aiolifxc and the shared helpers when run as a script
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCHMARKS, os.path.dirname(BENCHMARKS)]
+
+from aiolifxc import msgtypes  # NOQA: E402
+from aiolifxc.unpack import unpack_lifx_message  # NOQA: E402
+from samples import create  # NOQA: E402
+
+NUMBER = 20000
+
+
+def main() -> None:
+    print("{:<26} {:>5} {:>12} {:>10}".format("message", "id", "decodes/s", "ns/decode"))
+    rates = []
+    for msg_type, msg_id in sorted(msgtypes.MSG_IDS.items(), key=lambda item: item[1]):
+        packet = create(msg_type).generate_packed_message()
+        assert type(unpack_lifx_message(packet)) is msg_type
+        best = min(timeit.repeat(lambda: unpack_lifx_message(packet), number=NUMBER, repeat=3))
+        rate = NUMBER / best
+        rates.append(rate)
+        print("{:<26} {:>5} {:>12.0f} {:>10.0f}".format(msg_type.__name__, msg_id, rate, 1e9 / rate))
+    print("slowest/fastest: {:.2f}".format(max(rates) / min(rates)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+""" Compare packets/sec of the bitstring and struct wire encoders.
+
+Run from the top of the source tree::
+
+    python benchmarks/bench_encode.py
+"""
+import os
+import sys
+from typing import Any, Dict, List, Tuple, Type  # NOQA
+
+# Find aiolifxc and the shared helpers when run as a script
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCHMARKS, os.path.dirname(BENCHMARKS)]
+
+from aiolifxc import msgtypes  # NOQA: E402
+from aiolifxc.message import BROADCAST_MAC, Message  # NOQA: E402
+from aiolifxc.tests import legacy  # NOQA: E402
+from samples import rate  # NOQA: E402
+
+NUMBER = 2000
+
+MESSAGES = [
+    (msgtypes.GetService, BROADCAST_MAC, {}),
+    (msgtypes.SetPower, "d0:73:d5:12:34:56", {"power_level": 65535}),
+    (msgtypes.LightSetColor, "d0:73:d5:12:34:56", {"color": (21845, 65535, 32768, 3500), "duration": 0}),
+    (msgtypes.LightSetWaveform, "d0:73:d5:12:34:56", {
+        "transient": 1, "color": (0, 65535, 65535, 3500), "period": 100,
+        "cycles": 30.0, "duty_cycle": 0, "waveform": 0}),
+    (msgtypes.LightState, "d0:73:d5:12:34:56", {
+        "color": (0, 0, 65535, 3500), "reserved1": 0, "power_level": 65535,
+        "label": b"Kitchen", "reserved2": 0}),
+]  # type: List[Tuple[Type[Message], str, Dict[str, Any]]]
+
+
+def main() -> None:
+    print("{:<20} {:>14} {:>14} {:>8}".format("message", "bitstring/s", "struct/s", "speedup"))
+    for msg_type, target_addr, payload in MESSAGES:
+        def create() -> Message:
+            return msg_type(
+                target_addr=target_addr, source_id=0x12345678, seq_num=1,
+                payload=payload, ack_requested=True)
+
+        assert create().generate_packed_message() == legacy.generate_packed_message(create())
+        before = rate(lambda: legacy.generate_packed_message(create()), NUMBER)
+        after = rate(lambda: create().generate_packed_message(), NUMBER)
+        print("{:<20} {:>14.0f} {:>14.0f} {:>7.1f}x".format(
+            msg_type.__name__, before, after, after / before))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+""" Compare encoding set_color packets from scratch and from a header template.
+
+Run from the top of the source tree::
+
+    python benchmarks/bench_header.py
+"""
+import os
+import sys
+
+# Find aiolifxc and the shared helpers when run as a script
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCHMARKS, os.path.dirname(BENCHMARKS)]
+
+from aiolifxc import msgtypes  # NOQA: E402
+from aiolifxc.message import HeaderTemplate, Message  # NOQA: E402
+from samples import rate  # NOQA: E402
+
+NUMBER = 100000
+
+TARGET_ADDR = "d0:73:d5:12:34:56"
+SOURCE_ID = 0x12345678
+PAYLOAD = {"color": (21845, 65535, 32768, 3500), "duration": 0}
+
+
+def main() -> None:
+    msg = msgtypes.LightSetColor(
+        target_addr=TARGET_ADDR, source_id=SOURCE_ID, seq_num=1,
+        payload=PAYLOAD, ack_requested=True)  # type: Message
+    template = HeaderTemplate(msgtypes.LightSetColor, target_addr=TARGET_ADDR, source_id=SOURCE_ID)
+    payload = msg.schema.pack(msg)
+    assert template.pack_message(msg) == msg.generate_packed_message()
+
+    results = [
+        ("scratch", lambda: msg.get_header() + msg.schema.pack(msg)),
+        ("scratch, packed payload", lambda: msg.get_header() + payload),
+        ("template", lambda: template.pack_message(msg)),
+        ("template, packed payload", lambda: template.pack(payload, seq_num=1, ack_requested=True)),
+        ("copy only", lambda: bytes(payload)),
+    ]
+    print("{:<26} {:>14}".format("LightSetColor", "packets/s"))
+    for name, fun in results:
+        print("{:<26} {:>14.0f}".format(name, rate(fun, NUMBER)))
+
+
+if __name__ == "__main__":
+    main()
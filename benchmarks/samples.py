@@ -0,0 +1,31 @@
+""" Sample messages of every registered type, and timing, for the benchmarks.
+
+The payloads are the ones the tests use, so the two can't drift apart.
+"""
+import timeit
+from typing import Any, Callable, Dict, Type  # NOQA
+
+from aiolifxc.message import Message
+from aiolifxc.tests.test_message import PAYLOADS
+
+__all__ = ["PAYLOADS", "create", "rate"]
+
+REPEAT = 3
+
+
+def create(msg_type: Type[Message], **kwargs: Any) -> Message:
+    """ Create a sample message of `msg_type`. """
+    options = {
+        "target_addr": "d0:73:d5:12:34:56",
+        "source_id": 0x12345678,
+        "seq_num": 42,
+        "payload": PAYLOADS.get(msg_type, {}),
+    }  # type: Dict[str, Any]
+    options.update(kwargs)
+    return msg_type(**options)
+
+
+def rate(fun: Callable[[], Any], number: int) -> float:
+    """ Return the best calls/sec out of a few runs of `number` calls. """
+    best = min(timeit.repeat(fun, number=number, repeat=REPEAT))
+    return number / best
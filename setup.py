@@ -11,18 +11,23 @@ with open('README.rst') as readme_file:
 with open('HISTORY.rst') as history_file:
     history = history_file.read()
 
-requirements = [
-    "bitstring",
-]
+requirements = []
 
 setup_requirements = [
     'pytest-runner',
 ]
 
 test_requirements = [
+    # Reference encoder in aiolifxc.tests.legacy
+    'bitstring',
     'pytest',
 ]
 
+extras_requirements = {
+    # Multizone colour arrays, see aiolifxc.zones
+    'numpy': ['numpy'],
+}
+
 setup(
     name='aiolifxc',
     version='1.0.0',
@@ -35,6 +40,7 @@ setup(
     packages=find_packages(include=['aiolifxc']),
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
     license='MIT',
     keywords=['lifx', 'light', 'automation'],
     classifiers=[